@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+import time
+from concurrent import futures
+
+import sys
+sys.path.append('../')
+from image_packer import blf
+from image_packer import blf_solver
+
+
+def make_random_pieces(width, height, num_pieces):
+    pieces = list()
+    for uid in range(num_pieces):
+        w = random.randint(*width)
+        h = random.randint(*height)
+        pieces.append(blf.Piece(uid=uid, size=blf.Size(w, h)))
+
+    return pieces
+
+
+def measure(pieces, num_calls, make_executor):
+    '''Return the average time of a call of `solve`.'''
+    start = time.perf_counter()
+    for _ in range(num_calls):
+        executor = make_executor()
+        blf_solver.solve(
+            pieces=pieces,
+            container_width=512,
+            options={'engine': 'skyline', 'parallel': True},
+            executor=executor
+        )
+        if executor is not None:
+            executor.shutdown()
+    return (time.perf_counter() - start) / num_calls
+
+
+def main():
+    num_calls = 20
+
+    print('{:>8} {:>14} {:>14}'.format('pieces', 'new pool[s]', 'shared pool[s]'))
+    for num_pieces in (100, 500, 2000):
+        pieces = make_random_pieces(width=(4, 64), height=(4, 64), num_pieces=num_pieces)
+
+        new_pool = measure(pieces, num_calls, futures.ProcessPoolExecutor)
+        # Warm up the shared pool first.
+        blf_solver.get_executor()
+        shared_pool = measure(pieces, num_calls, lambda: None)
+        print('{:>8} {:>14.4f} {:>14.4f}'.format(num_pieces, new_pool, shared_pool))
+
+    blf_solver.shutdown_executor()
+
+
+if __name__ == '__main__':
+    main()
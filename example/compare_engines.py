@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+import time
+
+import sys
+sys.path.append('../')
+from image_packer import blf
+from image_packer import blf_solver
+
+
+def make_random_pieces(width, height, num_pieces):
+    pieces = list()
+    for uid in range(num_pieces):
+        w = random.randint(*width)
+        h = random.randint(*height)
+        pieces.append(blf.Piece(uid=uid, size=blf.Size(w, h)))
+
+    return pieces
+
+
+def main():
+    margin = blf.Thickness(top=1, right=1, bottom=1, left=1)
+
+    print('{:>8} {:>10} {:>10} {:>12}'.format('pieces', 'engine', 'time[s]', 'filling rate'))
+    for num_pieces in (100, 1000, 5000):
+        pieces = make_random_pieces(width=(4, 64), height=(4, 64), num_pieces=num_pieces)
+        pieces.sort(key=lambda piece: -piece.size.height)
+        container_width = int((sum(piece.size.area for piece in pieces) ** 0.5) * 1.2)
+
+        for engine in sorted(blf_solver.ENGINES):
+            start = time.perf_counter()
+            width, regions = blf_solver.ENGINES[engine](pieces, container_width, {'margin': margin})
+            elapsed = time.perf_counter() - start
+
+            container_size = blf_solver.calc_container_size(
+                container_width=width,
+                regions=regions,
+                margin=margin,
+                enable_auto_size=True,
+                force_pow2=False
+            )
+            filling_rate = blf_solver.calc_filling_rate(container_size, regions)
+            print('{:>8} {:>10} {:>10.3f} {:>12.4f}'.format(num_pieces, engine, elapsed, filling_rate))
+
+
+if __name__ == '__main__':
+    main()
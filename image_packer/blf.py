@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import bisect
+import logging
 import math
 import sys
+from collections import namedtuple
 
 
 __all__ = [
@@ -9,140 +12,201 @@ __all__ = [
     'Thickness',
     'Piece',
     'Region',
+    'RegionIndex',
+    'StablePointQueue',
     'next_power_of_2',
     'blf',
-    'LocationNotFoundError'
+    'fill',
+    'LocationNotFoundError',
+    'CancelledError'
 ]
 
+logger = logging.getLogger(__name__)
 
-class Size(object):
-    '''The Size class encapsulates the width and height of a component in a single object.'''
-    def __init__(self, width, height):
-        self._width = width
-        self._height = height
+# The engines check their `is_cancelled` option once per this many placements.
+CANCEL_CHECK_INTERVAL = 32
 
-    @property
-    def width(self):
-        return self._width
 
-    @property
-    def height(self):
-        return self._height
+class Size(namedtuple('Size', ('width', 'height'))):
+    '''The Size class encapsulates the width and height of a component in a single object.'''
+    __slots__ = ()
 
     @property
     def area(self):
-        return self._width * self._height
+        return self.width * self.height
 
 
-class Thickness(object):
+class Thickness(namedtuple('Thickness', ('top', 'right', 'bottom', 'left'))):
     '''This class represents the thickness of a frame around a rectangle.'''
-    def __init__(self, top, right, bottom, left):
-        self._top = top
-        self._right = right
-        self._bottom = bottom
-        self._left = left
+    __slots__ = ()
 
-    @property
-    def top(self):
-        return self._top
-
-    @property
-    def right(self):
-        return self._right
 
-    @property
-    def bottom(self):
-        return self._bottom
-
-    @property
-    def left(self):
-        return self._left
-
-
-class Piece(object):
+class Piece(namedtuple('Piece', ('uid', 'size'))):
     '''This class represents input information.'''
-    def __init__(self, uid, size):
-        self._uid = uid
-        self._size = size
-
-    @property
-    def uid(self):
-        return self._uid
-
-    @property
-    def size(self):
-        return self._size
+    __slots__ = ()
 
 
-class StablePoint(object):
+class StablePoint(namedtuple('StablePoint', ('x', 'y', 'gap_width', 'gap_height'))):
     '''This class represents a BL stable point.'''
-    def __init__(self, x=0, y=0, gap_width=0, gap_height=0):
-        self._x = x
-        self._y = y
-        self._gap_width = gap_width
-        self._gap_height = gap_height
+    __slots__ = ()
 
-    @property
-    def x(self):
-        return self._x
 
-    @property
-    def y(self):
-        return self._y
+StablePoint.__new__.__defaults__ = (0, 0, 0, 0)
 
-    @property
-    def gap_width(self):
-        return self._gap_width
-
-    @property
-    def gap_height(self):
-        return self._gap_height
 
+class StablePointQueue(object):
+    '''This class keeps BL stable points ordered by (y, x).
 
-class Region(object):
-    '''This class represents a rectangle in an integer coordinate system.'''
-    def __init__(self, uid, top, right, bottom, left):
-        self._uid = uid
-        self._top = top
-        self._right = right
-        self._bottom = bottom
-        self._left = left
+    Points with the same position are kept in insertion order.
+    '''
+    def __init__(self, points=()):
+        self._entries = list()
+        self._counter = 0
+        self._num_pruned = 0
+        self.extend(points)
 
-    @property
-    def uid(self):
-        return self._uid
+    def __len__(self):
+        return len(self._entries)
 
-    @property
-    def top(self):
-        return self._top
+    def __iter__(self):
+        return (entry[-1] for entry in self._entries)
 
-    @property
-    def right(self):
-        return self._right
+    def __getitem__(self, index):
+        return self._entries[index][-1]
 
     @property
-    def bottom(self):
-        return self._bottom
+    def num_pruned(self):
+        '''The number of points removed by :meth:`prune` or rejected by :meth:`offer`.'''
+        return self._num_pruned
+
+    def push(self, point):
+        '''Insert a stable point.'''
+        bisect.insort(self._entries, (point.y, point.x, self._counter, point))
+        self._counter += 1
+
+    def extend(self, points):
+        '''Insert stable points.'''
+        for point in points:
+            self.push(point)
+
+    def pop(self, index):
+        '''Remove and return the stable point at `index`.'''
+        return self._entries.pop(index)[-1]
+
+    def is_dominated(self, point):
+        '''Whether a queued point at the same position accepts every piece the point accepts.'''
+        entries = self._entries
+        i = bisect.bisect_left(entries, (point.y, point.x))
+        while i < len(entries) and entries[i][0] == point.y and entries[i][1] == point.x:
+            other = entries[i][-1]
+            if other.gap_width <= point.gap_width and other.gap_height <= point.gap_height:
+                return True
+            i += 1
+        return False
+
+    def offer(self, point, predicate):
+        '''Insert a stable point unless it is dominated or satisfies `predicate`.
+
+        Returns:
+            True if the point was inserted.
+        '''
+        if predicate(point) or self.is_dominated(point):
+            self._num_pruned += 1
+            return False
+        self.push(point)
+        return True
+
+    def prune(self, predicate, min_y=None, max_y=None):
+        '''Remove the points in the y range [min_y, max_y] that satisfy `predicate`.
+
+        Returns:
+            The number of removed points.
+        '''
+        entries = self._entries
+        lo = 0 if min_y is None else bisect.bisect_left(entries, (min_y,))
+        hi = len(entries) if max_y is None else bisect.bisect_left(entries, (max_y + 1,))
+        kept = [entry for entry in entries[lo:hi] if not predicate(entry[-1])]
+        num_removed = (hi - lo) - len(kept)
+        if num_removed:
+            entries[lo:hi] = kept
+            self._num_pruned += num_removed
+        return num_removed
+
+
+class Region(namedtuple('Region', ('uid', 'top', 'right', 'bottom', 'left', 'rotated'))):
+    '''This class represents a rectangle in an integer coordinate system.
+
+    If `rotated` is true, the piece is placed rotated by 90 degrees, so the width and the height are swapped.
+    '''
+    __slots__ = ()
 
-    @property
-    def left(self):
-        return self._left
+    def __new__(cls, uid, top, right, bottom, left, rotated=False):
+        return super(Region, cls).__new__(cls, uid, top, right, bottom, left, rotated)
 
     @property
     def width(self):
-        return self._right - self._left
+        return self.right - self.left
 
     @property
     def height(self):
-        return self._top - self._bottom
+        return self.top - self.bottom
 
     @property
     def area(self):
         return self.width * self.height
 
     @classmethod
-    def from_position_and_size(cls, uid, x, y, width, height):
-        return cls(uid=uid, top=y + height, right=x + width, bottom=y, left=x)
+    def from_position_and_size(cls, uid, x, y, width, height, rotated=False):
+        return cls(uid=uid, top=y + height, right=x + width, bottom=y, left=x, rotated=rotated)
+
+
+class RegionIndex(object):
+    '''This class represents a uniform grid over placed regions for fast collision queries.
+
+    Args:
+        cell_size (int): The length of a side of a grid cell.
+    '''
+    def __init__(self, cell_size):
+        self._cell_size = max(1, int(cell_size))
+        self._cells = dict()
+        self._regions = list()
+
+    def __len__(self):
+        return len(self._regions)
+
+    def __iter__(self):
+        return iter(self._regions)
+
+    @property
+    def cell_size(self):
+        return self._cell_size
+
+    def _cell_range(self, low, high):
+        # The cells overlapping the half-open interval [low, high).
+        return range(low // self._cell_size, max(low, high - 1) // self._cell_size + 1)
+
+    def add(self, region):
+        '''Add a region to the index.'''
+        self._regions.append(region)
+        for cy in self._cell_range(region.bottom, region.top):
+            for cx in self._cell_range(region.left, region.right):
+                cell = self._cells.get((cx, cy))
+                if cell is None:
+                    self._cells[(cx, cy)] = [region]
+                else:
+                    cell.append(region)
+
+    def query(self, left, bottom, right, top):
+        '''Iterate regions that may intersect the rectangle [left, right) x [bottom, top).
+
+        A region spanning multiple cells may be yielded more than once.
+        '''
+        cells = self._cells
+        for cy in self._cell_range(bottom, top):
+            for cx in self._cell_range(left, right):
+                cell = cells.get((cx, cy))
+                if cell is not None:
+                    yield from cell
 
 
 class LocationNotFoundError(Exception):
@@ -150,8 +214,27 @@ class LocationNotFoundError(Exception):
     pass
 
 
+class CancelledError(Exception):
+    '''Raised when an engine is stopped by its `is_cancelled` option.'''
+    pass
+
+
+def check_cancelled(is_cancelled, i):
+    '''Raise :class:`CancelledError` if `is_cancelled` is given and returns true.
+
+    It is called for the `i`-th piece, but `is_cancelled` is called only once per `CANCEL_CHECK_INTERVAL` pieces.
+    '''
+    if is_cancelled is not None and i % CANCEL_CHECK_INTERVAL == 0 and is_cancelled():
+        raise CancelledError
+
+
 class CorrectionInfo(object):
     '''The CorrectionInfo class encapsulates the correction information caused by a margin.'''
+    __slots__ = (
+        '_margin', '_h_spacing', '_v_spacing', '_h_overlap', '_v_overlap',
+        '_offset_x', '_offset_y', '_offset_w', '_offset_h'
+    )
+
     def __init__(self, margin, collapse_margin=False):
         self._margin = margin
         self._h_spacing = margin.left + margin.right
@@ -214,18 +297,21 @@ def find_point_index(
     current_size,
     other_regions,
     container_width,
-    correction_info
+    correction_info,
+    region_index=None
 ):
-    '''Find a BL point index.'''
+    '''Find a BL point index.
+
+    The stable points must be ordered by (y, x), e.g. by :class:`StablePointQueue`,
+    so that the first feasible point is the lowest-then-leftmost one.
+    If `region_index` is given, only the regions near each stable point are tested for collision.
+    '''
     margin = correction_info.margin
     h_spacing = correction_info.horizontal_spacing
     v_spacing = correction_info.vertical_spacing
     offset_x = correction_info.offset_x
     offset_y = correction_info.offset_y
 
-    min_x, min_y = sys.maxsize, sys.maxsize
-    last_used_id = None
-
     for i, point in enumerate(stable_points):
         if (current_size.width + h_spacing <= point.gap_width) \
                 or (current_size.height + v_spacing <= point.gap_height):
@@ -236,8 +322,18 @@ def find_point_index(
             continue
 
         # Whether the rectangle on the stable point is in collide with another rectangles.
+        if region_index is None:
+            candidates = other_regions
+        else:
+            candidates = region_index.query(
+                left=point.x - offset_x,
+                bottom=point.y - offset_y,
+                right=point.x + current_size.width + offset_x,
+                top=point.y + current_size.height + offset_y
+            )
+
         is_colliding = False
-        for other_region in other_regions:
+        for other_region in candidates:
             if (point.x - offset_x) >= other_region.right:
                 continue
             if (point.x + current_size.width + offset_x) <= other_region.left:
@@ -249,19 +345,59 @@ def find_point_index(
             is_colliding = True
             break
 
-        if is_colliding:
-            continue
+        if not is_colliding:
+            return i
 
-        # Update the location.
-        if (point.y < min_y) or (point.y == min_y and point.x < min_x):
-            min_x = point.x
-            min_y = point.y
-            last_used_id = i
+    raise LocationNotFoundError
 
-    if last_used_id is None:
-        raise LocationNotFoundError
 
-    return last_used_id
+def find_placement(
+    stable_points,
+    size,
+    other_regions,
+    container_width,
+    correction_info,
+    region_index=None,
+    enable_rotation=False,
+    container_height=None
+):
+    '''Find a BL point index for a piece in either orientation.
+
+    The lower-left point is better, and at the same point the orientation with the lower top.
+    If `container_height` is given, the orientations exceeding it are not used.
+
+    Returns:
+        index, :class:`Size` as placed, whether the piece is rotated
+
+    Raises:
+        LocationNotFoundError: If the piece fits nowhere.
+    '''
+    sizes = [(size, False)]
+    if enable_rotation and size.width != size.height:
+        sizes.append((Size(size.height, size.width), True))
+
+    best = None
+    for current_size, rotated in sizes:
+        try:
+            index = find_point_index(
+                stable_points=stable_points,
+                current_size=current_size,
+                other_regions=other_regions,
+                container_width=container_width,
+                correction_info=correction_info,
+                region_index=region_index
+            )
+        except LocationNotFoundError:
+            continue
+        top = stable_points[index].y + current_size.height
+        if container_height is not None and top + correction_info.margin.top > container_height:
+            continue
+        if best is None or (index, top) < (best[0], best[1]):
+            best = (index, top, current_size, rotated)
+
+    if best is None:
+        raise LocationNotFoundError
+    return best[0], best[2], best[3]
 
 
 def generate_stable_points(
@@ -350,16 +486,34 @@ def generate_stable_points(
     return stable_points
 
 
-def blf(pieces, container_width, options=None):
-    '''Run all iterations.
+def remaining_size_bounds(pieces, enable_rotation=False):
+    '''Calculate the smallest and largest piece sizes of every suffix of the pieces.
 
-    Args:
-        pieces (list(:class:`Piece`)):
-        container_width (int):
-        options (dict):
+    If `enable_rotation` is true, both orientations of each piece are covered.
 
     Returns:
-        container_width, list(:class:`Region`)
+        list(tuple(min_width, min_height, max_width, max_height)), where the i-th item covers pieces[i:].
+    '''
+    bounds = [None] * len(pieces)
+    min_w, min_h, max_w, max_h = sys.maxsize, sys.maxsize, 0, 0
+    for i in range(len(pieces) - 1, -1, -1):
+        width, height = pieces[i].size
+        if enable_rotation:
+            width, height = min(width, height), max(width, height)
+            min_w, min_h = min(min_w, width), min(min_h, width)
+            max_w, max_h = max(max_w, height), max(max_h, height)
+        else:
+            min_w, min_h = min(min_w, width), min(min_h, height)
+            max_w, max_h = max(max_w, width), max(max_h, height)
+        bounds[i] = (min_w, min_h, max_w, max_h)
+    return bounds
+
+
+def resolve_options(pieces, container_width, options):
+    '''Resolve the container width and the margin correction from the options.
+
+    Returns:
+        container_width, :class:`CorrectionInfo`
     '''
     if options is None:
         options = dict()
@@ -372,7 +526,11 @@ def blf(pieces, container_width, options=None):
     )
 
     if options.get('enable_auto_size', True):
-        max_width = max(pieces, key=lambda piece: piece.size.width).size.width
+        if options.get('enable_rotation', False):
+            # Every piece fits in its narrower orientation.
+            max_width = max(min(piece.size) for piece in pieces)
+        else:
+            max_width = max(pieces, key=lambda piece: piece.size.width).size.width
         max_width += margin.left + margin.right
         if container_width < max_width:
             container_width = max_width
@@ -380,9 +538,39 @@ def blf(pieces, container_width, options=None):
     if options.get('force_pow2', False):
         container_width = int(next_power_of_2(container_width))
 
+    return container_width, correction_info
+
+
+def blf(pieces, container_width, options=None):
+    '''Run all iterations.
+
+    Args:
+        pieces (list(:class:`Piece`)):
+        container_width (int):
+        options (dict):
+
+    Returns:
+        container_width, list(:class:`Region`)
+    '''
+    container_width, correction_info = resolve_options(pieces, container_width, options)
+    margin = correction_info.margin
+    # If true, each piece is placed in the better of both orientations.
+    enable_rotation = (options or {}).get('enable_rotation', False)
+    # If a dict is given, the number of pruned stable points is stored as 'num_pruned'.
+    stats = (options or {}).get('stats')
+    # If given, a function that returns true to stop the run with :class:`CancelledError`.
+    is_cancelled = (options or {}).get('is_cancelled')
+
+    # A cell a little larger than an average piece keeps each query to a few cells.
+    total_size = sum(piece.size.width + piece.size.height for piece in pieces)
+    average_size = total_size // max(1, 2 * len(pieces))
+    region_index = RegionIndex(
+        cell_size=average_size + max(correction_info.offset_x, correction_info.offset_y)
+    )
+
     regions = list()
-    stable_points = list()
-    stable_points.append(
+    stable_points = StablePointQueue()
+    stable_points.push(
         StablePoint(
             x=margin.left,
             y=margin.bottom,
@@ -391,13 +579,49 @@ def blf(pieces, container_width, options=None):
         )
     )
 
-    for piece in pieces:
-        index = find_point_index(
+    size_bounds = remaining_size_bounds(pieces, enable_rotation)
+    h_spacing = correction_info.horizontal_spacing
+    v_spacing = correction_info.vertical_spacing
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+    min_w, min_h, max_w, max_h = size_bounds[0] if pieces else (0, 0, 0, 0)
+    last_bounds = None
+
+    # The smallest remaining piece decides whether a point is covered or too close to the right edge,
+    # the largest one whether every remaining piece fits into the gap of a point.
+    def is_unusable(point):
+        return (point.x < 0) or (point.y < 0) \
+            or (point.x + min_w + margin.right > container_width) \
+            or (max_w + h_spacing <= point.gap_width) \
+            or (max_h + v_spacing <= point.gap_height)
+
+    def is_covered(point, region):
+        return ((point.x - offset_x) < region.right) \
+            and ((point.x + min_w + offset_x) > region.left) \
+            and ((point.y - offset_y) < region.top) \
+            and ((point.y + min_h + offset_y) > region.bottom)
+
+    def is_covered_by_any(point):
+        return any(
+            is_covered(point, region)
+            for region in region_index.query(
+                left=point.x - offset_x,
+                bottom=point.y - offset_y,
+                right=point.x + min_w + offset_x,
+                top=point.y + min_h + offset_y
+            )
+        )
+
+    for i, piece in enumerate(pieces):
+        check_cancelled(is_cancelled, i)
+        index, size, rotated = find_placement(
             stable_points=stable_points,
-            current_size=piece.size,
+            size=piece.size,
             other_regions=regions,
             container_width=container_width,
-            correction_info=correction_info
+            correction_info=correction_info,
+            region_index=region_index,
+            enable_rotation=enable_rotation
         )
         point = stable_points.pop(index)
 
@@ -405,15 +629,108 @@ def blf(pieces, container_width, options=None):
             uid=piece.uid,
             x=point.x,
             y=point.y,
-            width=piece.size.width,
-            height=piece.size.height
+            width=size.width,
+            height=size.height,
+            rotated=rotated
         )
         new_stable_points = generate_stable_points(
             current_region=new_region,
             other_regions=regions,
             correction_info=correction_info
         )
-        stable_points.extend(new_stable_points)
         regions.append(new_region)
+        region_index.add(new_region)
+
+        if i + 1 == len(pieces):
+            break
+
+        # Drop the points that no remaining piece can be placed on.
+        min_w, min_h, max_w, max_h = size_bounds[i + 1]
+        if (min_w, max_w, max_h) != last_bounds:
+            last_bounds = (min_w, max_w, max_h)
+            stable_points.prune(is_unusable)
+
+        stable_points.prune(
+            lambda point: is_covered(point, new_region),
+            min_y=new_region.bottom - min_h - offset_y + 1,
+            max_y=new_region.top + offset_y - 1
+        )
+
+        for point in new_stable_points:
+            stable_points.offer(point, lambda point: is_unusable(point) or is_covered_by_any(point))
+
+    logger.debug('Pruned {} stable points.'.format(stable_points.num_pruned))
+    if stats is not None:
+        stats['num_pruned'] = stable_points.num_pruned
 
     return container_width, regions
+
+
+def fill(pieces, regions, container_size, options=None):
+    '''Place pieces into the free space of an existing layout, without moving the placed regions.
+
+    The stable points are the bottom-right and top-left corners of the placed regions.
+
+    Args:
+        pieces (list(:class:`Piece`)):
+        regions (list(:class:`Region`)): The placed regions.
+        container_size (:class:`Size`): The fixed container size.
+        options (dict):
+
+    Returns:
+        list(:class:`Region`) of the pieces.
+
+    Raises:
+        LocationNotFoundError: If a piece does not fit into the container.
+    '''
+    container_width, container_height = container_size
+    _, correction_info = resolve_options(pieces, container_width, dict(options or {}, enable_auto_size=False))
+    margin = correction_info.margin
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+
+    total_size = sum(region.width + region.height for region in regions)
+    region_index = RegionIndex(cell_size=total_size // max(1, 2 * len(regions)) + max(offset_x, offset_y))
+
+    stable_points = StablePointQueue()
+    stable_points.push(StablePoint(x=margin.left, y=margin.bottom))
+
+    def add_region(region):
+        region_index.add(region)
+        stable_points.extend((
+            StablePoint(x=region.right + offset_x, y=region.bottom),
+            StablePoint(x=region.right + offset_x, y=margin.bottom),
+            StablePoint(x=region.left, y=region.top + offset_y),
+            StablePoint(x=margin.left, y=region.top + offset_y)
+        ))
+
+    for region in regions:
+        add_region(region)
+
+    new_regions = list()
+    for piece in pieces:
+        # The points are ordered by height, so no other point can be lower than the one found.
+        index, size, rotated = find_placement(
+            stable_points=stable_points,
+            size=piece.size,
+            other_regions=region_index,
+            container_width=container_width,
+            correction_info=correction_info,
+            region_index=region_index,
+            enable_rotation=(options or {}).get('enable_rotation', False),
+            container_height=container_height
+        )
+        point = stable_points.pop(index)
+
+        new_region = Region.from_position_and_size(
+            uid=piece.uid,
+            x=point.x,
+            y=point.y,
+            width=size.width,
+            height=size.height,
+            rotated=rotated
+        )
+        add_region(new_region)
+        new_regions.append(new_region)
+
+    return new_regions
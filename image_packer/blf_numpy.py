@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from . import blf as blf_
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = [
+    'is_available',
+    'blf'
+]
+
+# The number of candidate points tested at once first. It is doubled for each following batch.
+_INITIAL_BATCH_SIZE = 32
+
+
+def is_available():
+    '''Whether NumPy is installed.'''
+    return numpy is not None
+
+
+class _Regions(object):
+    '''This class represents placed regions as a struct of arrays.'''
+    def __init__(self, capacity):
+        self.left = numpy.empty(capacity, dtype=numpy.int64)
+        self.right = numpy.empty(capacity, dtype=numpy.int64)
+        self.bottom = numpy.empty(capacity, dtype=numpy.int64)
+        self.top = numpy.empty(capacity, dtype=numpy.int64)
+        self.count = 0
+
+    def append(self, region):
+        i = self.count
+        self.left[i] = region.left
+        self.right[i] = region.right
+        self.bottom[i] = region.bottom
+        self.top[i] = region.top
+        self.count += 1
+
+    def view(self):
+        n = self.count
+        return self.left[:n], self.right[:n], self.bottom[:n], self.top[:n]
+
+
+class _StablePoints(object):
+    '''This class represents stable points as a struct of arrays ordered by (y, x, seq).'''
+    def __init__(self):
+        self.x = numpy.empty(0, dtype=numpy.int64)
+        self.y = numpy.empty(0, dtype=numpy.int64)
+        self.gap_width = numpy.empty(0, dtype=numpy.int64)
+        self.gap_height = numpy.empty(0, dtype=numpy.int64)
+        self.seq = numpy.empty(0, dtype=numpy.int64)
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.x)
+
+    def extend(self, x, y, gap_width, gap_height):
+        seq = numpy.arange(self.counter, self.counter + len(x), dtype=numpy.int64)
+        self.counter += len(x)
+        self.x = numpy.concatenate((self.x, x))
+        self.y = numpy.concatenate((self.y, y))
+        self.gap_width = numpy.concatenate((self.gap_width, gap_width))
+        self.gap_height = numpy.concatenate((self.gap_height, gap_height))
+        self.seq = numpy.concatenate((self.seq, seq))
+        order = numpy.lexsort((self.seq, self.x, self.y))
+        self.select(order)
+
+    def select(self, indices):
+        self.x = self.x[indices]
+        self.y = self.y[indices]
+        self.gap_width = self.gap_width[indices]
+        self.gap_height = self.gap_height[indices]
+        self.seq = self.seq[indices]
+
+
+def _collides(x, y, width, height, regions, offset_x, offset_y):
+    '''Whether the rectangles at (x, y) collide with any of the regions.'''
+    left, right, bottom, top = regions.view()
+    return (
+        ((x - offset_x)[:, None] < right)
+        & ((x + width + offset_x)[:, None] > left)
+        & ((y - offset_y)[:, None] < top)
+        & ((y + height + offset_y)[:, None] > bottom)
+    ).any(axis=1)
+
+
+def find_point_index(stable_points, current_size, regions, container_width, correction_info):
+    '''Find a BL point index.'''
+    width, height = current_size.width, current_size.height
+    x, y = stable_points.x, stable_points.y
+
+    is_candidate = (width + correction_info.horizontal_spacing > stable_points.gap_width) \
+        & (height + correction_info.vertical_spacing > stable_points.gap_height) \
+        & (x >= 0) & (y >= 0) \
+        & (x + width + correction_info.margin.right <= container_width)
+    candidates = numpy.flatnonzero(is_candidate)
+
+    # The points are ordered, so the first batch containing a free point decides.
+    start, batch_size = 0, _INITIAL_BATCH_SIZE
+    while start < len(candidates):
+        batch = candidates[start:start + batch_size]
+        is_colliding = _collides(
+            x[batch], y[batch], width, height, regions, correction_info.offset_x, correction_info.offset_y)
+        free = numpy.flatnonzero(~is_colliding)
+        if len(free) > 0:
+            return int(batch[free[0]])
+        start += batch_size
+        batch_size *= 2
+
+    raise blf_.LocationNotFoundError
+
+
+def generate_stable_points(current_region, regions, correction_info):
+    '''Generate stable points.
+
+    Returns:
+        x, y, gap_width, gap_height arrays in the order of :func:`image_packer.blf.generate_stable_points`.
+    '''
+    margin = correction_info.margin
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+    offset_w = correction_info.offset_width
+    offset_h = correction_info.offset_height
+
+    c_top, c_right = current_region.top, current_region.right
+    c_bottom, c_left = current_region.bottom, current_region.left
+    left, right, bottom, top = regions.view()
+
+    # The cases are exclusive and tested in the same order as the pure-Python implementation.
+    is_left = ((c_right + offset_x) <= left) & (c_top > top)
+    is_right = ~is_left & ((c_left - offset_x) >= right) & (c_top < top)
+    is_lower = ~is_left & ~is_right & ((c_top + offset_y) <= bottom) & (c_right > right)
+    is_upper = ~is_left & ~is_right & ~is_lower & ((c_bottom - offset_y) >= top) & (c_right < right)
+
+    zero = numpy.zeros_like(left)
+    x = numpy.where(is_left | is_upper, c_right + offset_x, right + offset_x)
+    y = numpy.where(is_left | is_upper, top + offset_y, c_top + offset_y)
+    w = numpy.select(
+        (is_left, is_right, is_lower),
+        (
+            left - c_right + offset_w,
+            c_left - right + offset_w,
+            numpy.where((c_left + offset_w) > right, c_left - right + offset_w, zero)
+        ),
+        numpy.where((c_right - offset_w) < left, left - c_right + offset_w, zero)
+    )
+    h = numpy.select(
+        (is_left, is_right, is_lower),
+        (
+            numpy.where((c_bottom + offset_h) > top, c_bottom - top + offset_h, zero),
+            numpy.where((c_top - offset_h) < bottom, bottom - c_top + offset_h, zero),
+            bottom - c_top + offset_h
+        ),
+        c_bottom - top + offset_h
+    )
+
+    selected = is_left | is_right | is_lower | is_upper
+    head = (
+        (c_right + offset_x, 0 + margin.bottom, 0, c_bottom - margin.bottom + correction_info.vertical_overlap),
+        (0 + margin.left, c_top + offset_y, c_left - margin.left + correction_info.horizontal_overlap, 0)
+    )
+    return tuple(
+        numpy.concatenate((numpy.array([point[i] for point in head], dtype=numpy.int64), values[selected]))
+        for i, values in enumerate((x, y, w, h))
+    )
+
+
+def blf(pieces, container_width, options=None):
+    '''Run all iterations with NumPy arrays.
+
+    The result is identical to :func:`image_packer.blf.blf`, which is used instead if NumPy is not installed.
+
+    Args:
+        pieces (list(:class:`image_packer.blf.Piece`)):
+        container_width (int):
+        options (dict):
+
+    Returns:
+        container_width, list(:class:`image_packer.blf.Region`)
+    '''
+    if numpy is None:
+        return blf_.blf(pieces, container_width, options)
+
+    container_width, correction_info = blf_.resolve_options(pieces, container_width, options)
+    margin = correction_info.margin
+    h_spacing = correction_info.horizontal_spacing
+    v_spacing = correction_info.vertical_spacing
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+
+    size_bounds = blf_.remaining_size_bounds(pieces)
+    is_cancelled = (options or {}).get('is_cancelled')
+
+    regions = list()
+    region_arrays = _Regions(capacity=len(pieces))
+    stable_points = _StablePoints()
+    stable_points.extend(*(numpy.array([value], dtype=numpy.int64) for value in (margin.left, margin.bottom, 0, 0)))
+
+    for i, piece in enumerate(pieces):
+        blf_.check_cancelled(is_cancelled, i)
+        index = find_point_index(
+            stable_points=stable_points,
+            current_size=piece.size,
+            regions=region_arrays,
+            container_width=container_width,
+            correction_info=correction_info
+        )
+
+        new_region = blf_.Region.from_position_and_size(
+            uid=piece.uid,
+            x=int(stable_points.x[index]),
+            y=int(stable_points.y[index]),
+            width=piece.size.width,
+            height=piece.size.height
+        )
+        x, y, w, h = generate_stable_points(
+            current_region=new_region,
+            regions=region_arrays,
+            correction_info=correction_info
+        )
+        regions.append(new_region)
+        region_arrays.append(new_region)
+
+        if i + 1 == len(pieces):
+            break
+
+        # Drop the used point and the points that no remaining piece can be placed on,
+        # in the same way as the pure-Python implementation.
+        min_w, min_h, max_w, max_h = size_bounds[i + 1]
+        px, py = stable_points.x, stable_points.y
+        keep = ~(
+            (px + min_w + margin.right > container_width)
+            | (max_w + h_spacing <= stable_points.gap_width)
+            | (max_h + v_spacing <= stable_points.gap_height)
+            | (
+                ((px - offset_x) < new_region.right) & ((px + min_w + offset_x) > new_region.left)
+                & ((py - offset_y) < new_region.top) & ((py + min_h + offset_y) > new_region.bottom)
+            )
+        )
+        keep[index] = False
+        stable_points.select(keep)
+
+        keep = numpy.flatnonzero(~(
+            (x < 0) | (y < 0)
+            | (x + min_w + margin.right > container_width)
+            | (max_w + h_spacing <= w)
+            | (max_h + v_spacing <= h)
+        ))
+        keep = keep[~_collides(x[keep], y[keep], min_w, min_h, region_arrays, offset_x, offset_y)]
+        stable_points.extend(x[keep], y[keep], w[keep], h[keep])
+
+    return container_width, regions
@@ -1,15 +1,81 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import atexit
+import functools
 import logging
+import math
+import multiprocessing
 import os
+import pickle
+import random
+import threading
+import time
+from array import array
 from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
 from . import blf
+from . import blf_numpy
+from . import cache as cache_
+from . import maxrects
+from . import shelf
+from . import skyline
 
 
-__all__ = ['solve']
+__all__ = [
+    'solve',
+    'solve_pages',
+    'get_executor',
+    'shutdown_executor',
+    'calibrate_engine'
+]
 
 logger = logging.getLogger(__name__)
 
+# Available packing engines.
+ENGINES = {
+    'blf': blf.blf,
+    # Falls back to 'blf' if NumPy is not installed.
+    'blf_numpy': blf_numpy.blf,
+    # Bottom-left skyline with a waste map. Faster than 'blf' for very large inputs.
+    'skyline': skyline.skyline,
+    # MaxRects with the best short side fit, best area fit, bottom-left and contact point heuristics.
+    'maxrects_bssf': functools.partial(maxrects.maxrects, heuristic='bssf'),
+    'maxrects_baf': functools.partial(maxrects.maxrects, heuristic='baf'),
+    'maxrects_bl': functools.partial(maxrects.maxrects, heuristic='bl'),
+    'maxrects_cp': functools.partial(maxrects.maxrects, heuristic='cp'),
+    # Next-fit shelves. The fastest, for packs that only need a reasonable filling rate.
+    'shelf': shelf.shelf,
+}
+
+# The engines that can rotate pieces by 90 degrees. The others place them as they are.
+ROTATING_ENGINES = frozenset(('blf', ))
+
+# The worker pool shared by the calls of `solve`. It is created on first use.
+_executor = None
+_num_workers = os.cpu_count()
+_executor_lock = threading.Lock()
+# The manager of the events that stop the running evaluations of `solve` early. It is created on first use.
+_manager = None
+
+# The cost model of the dispatch between serial and parallel execution.
+# The time of an engine for n pieces with a size spread s, as by `calc_size_spread`, is modelled as
+# coefficient * n ** exponent * (s / s0) ** spread_exponent, fitted on first use from runs with the numbers
+# of pieces below with sides in the wide range, and a run with sides in the narrow range.
+# s0 is the spread of the wide range.
+_CALIBRATION_SIZES = (32, 128)
+_CALIBRATION_WIDE_SIDES = (4, 64)
+_CALIBRATION_NARROW_SIDES = (32, 40)
+_engine_costs = dict()
+# Inputs up to this size are always packed serially, without calibration.
+_MIN_PARALLEL_PIECES = _CALIBRATION_SIZES[0]
+# The time to start a pool and the time of a round trip to all workers, in seconds.
+# The defaults are used until the shared pool is started and measured.
+_pool_startup = 0.5
+_pool_round_trip = 0.005
+
+# The ratio between successive candidates of the automatic width search.
+_AUTO_WIDTH_RATIO = 1.125
+
 
 def calc_minimum_container_size(regions, margin):
     '''Calculate a minimum container size from rectangles.'''
@@ -44,26 +110,115 @@ def calc_filling_rate(container_size, regions):
     return area / container_size.area
 
 
-def solver1(pieces, container_width, options):
-    '''Inputs are sorted in descending order of height before execution.'''
-    pieces.sort(key=lambda piece: -piece.size.height)
-    container_width, regions = blf.blf(pieces, container_width, options)
-    container_size = calc_container_size(
-        container_width=container_width,
-        regions=regions,
-        margin=options['margin'],
-        enable_auto_size=options['enable_auto_size'],
-        force_pow2=options['force_pow2']
+def calc_area_lower_bound(pieces, correction_info):
+    '''Calculate a lower bound of the container area.
+
+    Pieces grown by the spacing between them never overlap inside the container.
+    '''
+    return sum(
+        (piece.size.width + correction_info.offset_x) * (piece.size.height + correction_info.offset_y)
+        for piece in pieces
     )
-    filling_rate = calc_filling_rate(container_size, regions)
 
-    return filling_rate, container_size, regions
 
+def calc_size_spread(pieces):
+    '''Return the ratio of the longest side to the shortest side of the pieces.'''
+    longest = max(max(piece.size) for piece in pieces)
+    shortest = min(min(piece.size) for piece in pieces)
+    return longest / max(1, shortest)
+
+
+def calc_candidate_widths(pieces, margin, correction_info, force_pow2):
+    '''Calculate the container widths tried by the automatic width search.
+
+    The candidates range from the square root of the area lower bound to the width of a single row,
+    in geometric steps or in powers of two.
+    '''
+    offset_x = correction_info.offset_x
+    min_width = max((piece.size.width for piece in pieces), default=1) + margin.left + margin.right
+    max_width = max(
+        min_width,
+        sum(piece.size.width + offset_x for piece in pieces) - offset_x + margin.left + margin.right
+    )
+    start = min(max_width, max(min_width, int(math.ceil(math.sqrt(calc_area_lower_bound(pieces, correction_info))))))
+
+    widths = list()
+    if force_pow2:
+        width = int(blf.next_power_of_2(min_width))
+        while width * 2 <= start:
+            width *= 2
+        while True:
+            widths.append(width)
+            if width >= max_width:
+                break
+            width *= 2
+    else:
+        width = start
+        while width < max_width:
+            widths.append(width)
+            width = max(width + 1, int(width * _AUTO_WIDTH_RATIO))
+        widths.append(max_width)
+
+    return widths
+
+
+def by_height(piece):
+    '''Sort key in descending order of height.'''
+    return -piece.size.height
+
+
+def by_area(piece):
+    '''Sort key in descending order of area.'''
+    return -piece.size.area
+
+
+def by_height_and_width(piece):
+    '''Sort key in descending order of height and width.'''
+    return -piece.size.height, -piece.size.width
+
+
+def by_width(piece):
+    '''Sort key in descending order of width.'''
+    return -piece.size.width
+
+
+def by_perimeter(piece):
+    '''Sort key in descending order of perimeter.'''
+    return -(piece.size.width + piece.size.height)
+
+
+def by_max_side(piece):
+    '''Sort key in descending order of the longer side, then the shorter side.'''
+    width, height = piece.size
+    return -max(width, height), -min(width, height)
 
-def solver2(pieces, container_width, options):
-    '''Inputs are sorted in descending order of area before execution.'''
-    pieces.sort(key=lambda piece: -piece.size.area)
-    container_width, regions = blf.blf(pieces, container_width, options)
+
+def by_aspect_ratio(piece):
+    '''Sort key in descending order of the ratio of the longer side to the shorter side, then area.'''
+    width, height = piece.size
+    return -max(width, height) / max(1, min(width, height)), -piece.size.area
+
+
+# Built-in orderings of inputs.
+ORDERINGS = {
+    'height': by_height,
+    'area': by_area,
+    'height_width': by_height_and_width,
+    'width': by_width,
+    'perimeter': by_perimeter,
+    'max_side': by_max_side,
+    'aspect_ratio': by_aspect_ratio,
+}
+
+
+def run_solver(pieces, container_width, options, key):
+    '''Inputs are sorted by `key` before execution.
+
+    Returns:
+        filling_rate, :class:`Size`, list(:class:`Region`)
+    '''
+    pieces = sorted(pieces, key=key)
+    container_width, regions = ENGINES[options['engine']](pieces, container_width, options)
     container_size = calc_container_size(
         container_width=container_width,
         regions=regions,
@@ -76,33 +231,233 @@ def solver2(pieces, container_width, options):
     return filling_rate, container_size, regions
 
 
-def solver3(pieces, container_width, options):
-    '''Inputs are sorted in descending order of height and width before execution.'''
-    pieces.sort(key=lambda piece: (-piece.size.height, -piece.size.width))
-    container_width, regions = blf.blf(pieces, container_width, options)
-    container_size = calc_container_size(
+def pack_sizes(pieces):
+    '''Pack the piece sizes into a flat array of (width, height) pairs.'''
+    sizes = array('i')
+    for piece in pieces:
+        sizes.append(piece.size.width)
+        sizes.append(piece.size.height)
+    return sizes
+
+
+def unpack_regions(pieces, placements):
+    '''Rebuild regions from a flat array of (index, x, y, rotated) quadruples.'''
+    regions = list()
+    for i in range(0, len(placements), 4):
+        piece = pieces[placements[i]]
+        width, height = piece.size
+        rotated = bool(placements[i + 3])
+        if rotated:
+            width, height = height, width
+        regions.append(
+            blf.Region.from_position_and_size(
+                uid=piece.uid,
+                x=placements[i + 1],
+                y=placements[i + 2],
+                width=width,
+                height=height,
+                rotated=rotated
+            )
+        )
+    return regions
+
+
+def run_packed_solver(sizes, container_width, options, key, cancel_event=None):
+    '''Run :func:`run_solver` on the sizes from :func:`pack_sizes`.
+
+    This is the entry point for worker processes. Only the packed sizes are sent to the worker,
+    and only the placements are sent back,
+    as a flat array of (index, x, y, rotated) quadruples for :func:`unpack_regions`.
+    If `cancel_event` is given, the engine stops with :class:`image_packer.blf.CancelledError` once it is set.
+    '''
+    if cancel_event is not None:
+        options = dict(options, is_cancelled=cancel_event.is_set)
+    pieces = [blf.Piece(uid=i, size=blf.Size(sizes[i * 2], sizes[i * 2 + 1])) for i in range(len(sizes) // 2)]
+    filling_rate, container_size, regions = run_solver(
+        pieces=pieces,
         container_width=container_width,
-        regions=regions,
-        margin=options['margin'],
-        enable_auto_size=options['enable_auto_size'],
-        force_pow2=options['force_pow2']
+        options=options,
+        key=key
     )
-    filling_rate = calc_filling_rate(container_size, regions)
 
-    return filling_rate, container_size, regions
+    placements = array('i')
+    for region in regions:
+        placements.append(region.uid)
+        placements.append(region.left)
+        placements.append(region.bottom)
+        placements.append(int(region.rotated))
+
+    return filling_rate, tuple(container_size), placements
+
+
+def get_executor():
+    '''Return the shared worker pool, creating it if necessary.
+
+    The pool stays alive across calls of :func:`solve`, so that repeated packs do not pay for the process startup.
+    It is shut down at exit, or by :func:`shutdown_executor`.
+    '''
+    global _executor, _pool_startup, _pool_round_trip
+    with _executor_lock:
+        if _executor is None:
+            start = time.perf_counter()
+            _executor = futures.ProcessPoolExecutor(max_workers=_num_workers)
+            atexit.register(shutdown_executor)
+            # Workers are started by the first round trip, and the second one shows the warm overhead.
+            _round_trip(_executor, _num_workers)
+            _pool_startup = time.perf_counter() - start
+            _pool_round_trip = _round_trip(_executor, _num_workers)
+            logger.debug('Pool startup: {}s, round trip: {}s'.format(_pool_startup, _pool_round_trip))
+        return _executor
+
+
+def shutdown_executor(wait=True):
+    '''Shut down the shared worker pool. The next call of :func:`get_executor` creates a new one.'''
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        atexit.unregister(shutdown_executor)
+        executor.shutdown(wait=wait)
+
+
+def make_cancel_event():
+    '''Return a new event that can be sent to worker processes, to stop their evaluations.
+
+    The events are served by a manager process, which is started on first use and stopped at exit.
+    '''
+    global _manager
+    with _executor_lock:
+        if _manager is None:
+            _manager = multiprocessing.Manager()
+        return _manager.Event()
+
+
+def _noop():
+    pass
+
+
+def _round_trip(executor, num_workers):
+    '''Measure the time to run a no-op task on every worker.'''
+    start = time.perf_counter()
+    for future in [executor.submit(_noop) for _ in range(num_workers)]:
+        future.result()
+    return time.perf_counter() - start
+
+
+def _calc_range_spread(sides):
+    return sides[1] / sides[0]
+
+
+def _make_calibration_pieces(rng, sides):
+    return [
+        blf.Piece(uid=uid, size=blf.Size(rng.randint(*sides), rng.randint(*sides)))
+        for uid in range(_CALIBRATION_SIZES[-1])
+    ]
+
+
+def _time_engine(engine, pieces):
+    '''Return the best time of two runs of an engine, to reduce the noise.'''
+    pieces = sorted(pieces, key=by_height)
+    container_width = int(math.sqrt(sum(piece.size.area for piece in pieces)) * 1.2) + 64
+    elapsed = None
+    for _ in range(2):
+        start = time.perf_counter()
+        ENGINES[engine](pieces, container_width)
+        elapsed = min(elapsed or float('inf'), time.perf_counter() - start)
+    return max(elapsed, 1e-6)
+
+
+def calibrate_engine(engine):
+    '''Fit the cost model of an engine by timing it on small random inputs.
+
+    The result is cached for the process.
+
+    Returns:
+        coefficient, exponent, spread_exponent
+    '''
+    if engine in _engine_costs:
+        return _engine_costs[engine]
+
+    rng = random.Random(0)
+    wide_pieces = _make_calibration_pieces(rng, _CALIBRATION_WIDE_SIDES)
+    narrow_pieces = _make_calibration_pieces(rng, _CALIBRATION_NARROW_SIDES)
+    times = [_time_engine(engine, wide_pieces[:num_pieces]) for num_pieces in _CALIBRATION_SIZES]
+    narrow_time = _time_engine(engine, narrow_pieces)
+
+    exponent = math.log(times[-1] / times[0]) / math.log(_CALIBRATION_SIZES[-1] / _CALIBRATION_SIZES[0])
+    exponent = min(3.0, max(1.0, exponent))
+    coefficient = times[-1] / _CALIBRATION_SIZES[-1] ** exponent
+    spread_ratio = _calc_range_spread(_CALIBRATION_WIDE_SIDES) / _calc_range_spread(_CALIBRATION_NARROW_SIDES)
+    spread_exponent = min(1.0, max(0.0, math.log(times[-1] / narrow_time) / math.log(spread_ratio)))
+    logger.debug('Cost of {}: {} * n ** {} * s ** {}'.format(engine, coefficient, exponent, spread_exponent))
+
+    _engine_costs[engine] = coefficient, exponent, spread_exponent
+    return _engine_costs[engine]
+
+
+def is_parallel_faster(engines, pieces, num_workers=None):
+    '''Estimate whether running the tasks for `engines` in worker processes is faster than running them here.
+
+    Args:
+        engines (list(str)):
+        pieces (list(:class:`Piece`)):
+        num_workers (int): The workers of a given executor, or None for the shared pool.
+    '''
+    if num_workers is None:
+        num_workers = _num_workers
+        startup = 0.0 if _executor is not None else _pool_startup
+    else:
+        startup = 0.0
+    # A single worker cannot beat running here, so the engines are not calibrated for nothing.
+    if num_workers <= 1:
+        return False
+
+    num_pieces = len(pieces)
+    spread = calc_size_spread(pieces) / _calc_range_spread(_CALIBRATION_WIDE_SIDES)
+    costs = list()
+    for engine in engines:
+        coefficient, exponent, spread_exponent = calibrate_engine(engine)
+        costs.append(coefficient * num_pieces ** exponent * spread ** spread_exponent)
+
+    serial_time = sum(costs)
+    num_waves = int(math.ceil(len(costs) / num_workers))
+    parallel_time = startup + num_waves * _pool_round_trip + max(max(costs), serial_time / num_workers)
+    logger.debug('Estimated time: serial={}s, parallel={}s'.format(serial_time, parallel_time))
+
+    return parallel_time < serial_time
+
+
+def is_picklable(obj):
+    '''Whether an object can be sent to a worker process.'''
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
 
 
 def solve(
     pieces,
     container_width,
-    options=None
+    options=None,
+    executor=None,
+    cache=None
 ):
     '''Obtain the highest filling rate result.
 
+    Every ordering in the portfolio is run with every engine, and the evaluation stops early
+    once a result reaches the target filling rate or the area lower bound.
+    If `container_width` is 'auto', candidate widths are searched as well. The highest filling rate
+    is then the smallest container area, in powers of two if `force_pow2` is set.
+
     Args:
         pieces (list(:class:`Piece`)):
-        container_width (int):
+        container_width (int or str): A width or 'auto'.
         options (dict):
+        executor (:class:`concurrent.futures.Executor`): Runs the evaluations of large inputs.
+            The shared pool from :func:`get_executor` is used if not given. It is not shut down here.
+        cache (:class:`image_packer.cache.LayoutCache`): If given, a layout found for the same piece sizes,
+            width and options is reused, and a new layout is stored.
 
     Returns:
         container_width, container_height, list(:class:`Region`)
@@ -113,7 +468,21 @@ def solve(
         # If true, the size will be adjusted automatically.
         'enable_auto_size': True,
         # If true, the power-of-two rule is forced.
-        'force_pow2': False
+        'force_pow2': False,
+        # The name of a packing engine in `ENGINES`, or a sequence of names to try them all.
+        'engine': 'blf',
+        # Names in `ORDERINGS` or sort key functions taking a :class:`Piece`.
+        # Key functions must be picklable, i.e. defined at module level, to run in worker processes.
+        'orderings': ('height', 'area', 'height_width'),
+        # If given, stop as soon as a result reaches this filling rate.
+        'target_filling_rate': None,
+        # If true or false, forces parallel or serial execution.
+        # If None, the faster one is estimated from a cost model calibrated on this machine.
+        'parallel': None,
+        # The number of workers of the given executor, for the estimate. If None, the number of CPUs is assumed.
+        'num_workers': None,
+        # If true, pieces may be rotated by 90 degrees by the engines in `ROTATING_ENGINES`.
+        'enable_rotation': False
     }
 
     if options is None:
@@ -121,46 +490,261 @@ def solve(
     else:
         options = {key: options[key] if key in options else default_options[key] for key in default_options.keys()}
 
-    solvers = (solver1, solver2, solver3)
-    best_filling_rate = -1.0
-    result = (0, 0, None)
+    engines = (options['engine'], ) if isinstance(options['engine'], str) else tuple(options['engine'])
+    for engine in engines:
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine: {}'.format(engine))
 
-    if len(pieces) < 100:
-        for solver in solvers:
-            filling_rate, container_size, regions = solver(
-                pieces=pieces,
-                container_width=container_width,
-                options=options
+    orderings = list()
+    for ordering in options['orderings']:
+        if callable(ordering):
+            orderings.append((getattr(ordering, '__name__', repr(ordering)), ordering))
+        elif ordering in ORDERINGS:
+            orderings.append((ordering, ORDERINGS[ordering]))
+        else:
+            raise ValueError('Unknown ordering: {}'.format(ordering))
+
+    # Pieces of the same size are interchangeable, so the layout depends only on the multiset of sizes.
+    pieces = cache_.canonical_order(pieces)
+
+    cache_key = None
+    if cache is not None:
+        # The execution mode does not change the result.
+        cache_key = cache_.make_layout_key(
+            pieces,
+            container_width,
+            {key: value for key, value in options.items() if key not in ('parallel', 'num_workers')}
+        )
+    if cache_key is not None:
+        layout = cache.get(cache_key)
+        if layout is not None:
+            logger.debug('Found a cached layout.')
+            width, height, placements = layout
+            return width, height, unpack_regions(pieces, [value for placement in placements for value in placement])
+
+    correction_info = blf.CorrectionInfo(margin=options['margin'], collapse_margin=options['collapse_margin'])
+    if container_width == 'auto':
+        widths = calc_candidate_widths(pieces, options['margin'], correction_info, options['force_pow2'])
+    else:
+        widths = (container_width, )
+
+    # Every ordering is run with every engine and every width.
+    engine_options = {key: options[key] for key in ('margin', 'collapse_margin', 'enable_auto_size', 'force_pow2')}
+    tasks = [
+        (
+            '{} with {} at {}'.format(name, engine, width),
+            width,
+            key,
+            dict(
+                engine_options,
+                engine=engine,
+                enable_rotation=options['enable_rotation'] and engine in ROTATING_ENGINES
             )
-            logger.debug(
-                'Result of {}: fl={}, w={}, h={}'.format(
-                    solver.__name__, filling_rate, container_size.width, container_size.height)
+        )
+        for width in widths for name, key in orderings for engine in engines
+    ]
+
+    target_filling_rate = options['target_filling_rate']
+    area_lower_bound = calc_area_lower_bound(pieces, correction_info)
+
+    best = None
+
+    def update(index, filling_rate, container_size, regions):
+        '''Keep the best result and return whether the evaluation can stop.'''
+        nonlocal best
+        logger.debug(
+            'Result of {}: fl={}, w={}, h={}'.format(
+                tasks[index][0], filling_rate, container_size.width, container_size.height)
+        )
+        # Ties are broken by the order of the tasks, so that the result does not depend on timing.
+        if best is None or (filling_rate, -index) > (best[0], -best[1]):
+            best = (filling_rate, index, container_size, regions)
+
+        if target_filling_rate is not None and filling_rate >= target_filling_rate:
+            logger.debug('Reached the target filling rate.')
+            return True
+        if container_size.area <= area_lower_bound:
+            logger.debug('Reached the area lower bound.')
+            return True
+        return False
+
+    if options['parallel'] is None:
+        num_workers = None if executor is None else options['num_workers'] or os.cpu_count()
+        is_parallel = len(pieces) > _MIN_PARALLEL_PIECES \
+            and is_parallel_faster([task[3]['engine'] for task in tasks], pieces, num_workers)
+    else:
+        is_parallel = options['parallel']
+
+    if not is_parallel:
+        for index, (_, width, key, task_options) in enumerate(tasks):
+            filling_rate, container_size, regions = run_solver(
+                pieces=pieces,
+                container_width=width,
+                options=task_options,
+                key=key
             )
-            if filling_rate > best_filling_rate:
-                best_filling_rate = filling_rate
-                result = (container_size.width, container_size.height, regions)
+            if update(index, filling_rate, container_size, regions):
+                break
     else:
-        max_workers = min(os.cpu_count(), len(solvers))
-        with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-            future_to_name = {
+        sizes = pack_sizes(pieces)
+        remote_tasks = [index for index, task in enumerate(tasks) if is_picklable(task[2])]
+        local_tasks = [index for index in range(len(tasks)) if index not in remote_tasks]
+
+        if executor is None:
+            executor = get_executor()
+        cancel_event = make_cancel_event()
+        future_to_index = dict()
+        try:
+            future_to_index = {
                 executor.submit(
-                    solver,
+                    run_packed_solver,
+                    sizes=sizes,
+                    container_width=tasks[index][1],
+                    options=tasks[index][3],
+                    key=tasks[index][2],
+                    cancel_event=cancel_event
+                ): index
+                for index in remote_tasks
+            }
+
+            # Tasks that cannot be sent to workers run here in the meantime.
+            is_done = False
+            for index in local_tasks:
+                filling_rate, container_size, regions = run_solver(
                     pieces=pieces,
-                    container_width=container_width,
+                    container_width=tasks[index][1],
+                    options=tasks[index][3],
+                    key=tasks[index][2]
+                )
+                if update(index, filling_rate, container_size, regions):
+                    is_done = True
+                    break
+
+            if not is_done:
+                for future in futures.as_completed(future_to_index):
+                    filling_rate, container_size, placements = future.result()
+                    container_size = blf.Size(*container_size)
+                    regions = unpack_regions(pieces, placements)
+                    if update(future_to_index[future], filling_rate, container_size, regions):
+                        break
+        except BrokenProcessPool:
+            # A worker died, so the shared pool cannot be used any more.
+            if executor is _executor:
+                shutdown_executor(wait=False)
+            raise
+        finally:
+            # Cancel the evaluations not started yet, and stop the running ones at their next check,
+            # so that they do not keep the workers busy for the following calls.
+            cancel_event.set()
+            for future in future_to_index:
+                future.cancel()
+
+    best_filling_rate, _, container_size, regions = best
+
+    if cache_key is not None:
+        uid_to_index = {piece.uid: i for i, piece in enumerate(pieces)}
+        placements = [
+            (uid_to_index[region.uid], region.left, region.bottom, int(region.rotated)) for region in regions
+        ]
+        cache.put(cache_key, container_size.width, container_size.height, placements)
+    logger.debug(
+        'Final result: fl={}, w={}, h={}'.format(best_filling_rate, container_size.width, container_size.height))
+
+    return container_size.width, container_size.height, regions
+
+
+def solve_pages(
+    pieces,
+    container_width,
+    max_height,
+    options=None,
+    executor=None,
+    cache=None
+):
+    '''Obtain the highest filling rate results in pages no taller than `max_height`.
+
+    Each page is solved with :func:`solve` for all remaining pieces, and keeps the regions below the limit.
+    The pieces crossing the limit are placed into the free space of the page if possible,
+    and the others spill over into the next page.
+
+    Args:
+        pieces (list(:class:`Piece`)):
+        container_width (int or str): A width or 'auto'.
+        max_height (int): The maximum container height.
+            If `force_pow2` is set, the largest power of two not greater than it is used.
+        options (dict): The options of :func:`solve`.
+        executor (:class:`concurrent.futures.Executor`):
+        cache (:class:`image_packer.cache.LayoutCache`):
+
+    Returns:
+        list((container_width, container_height, list(:class:`Region`)))
+
+    Raises:
+        ValueError: If a piece does not fit into `max_height`, or no piece of a page does.
+    '''
+    options = dict() if options is None else options
+    margin = options.get('margin', blf.Thickness(0, 0, 0, 0))
+    enable_auto_size = options.get('enable_auto_size', True)
+    force_pow2 = options.get('force_pow2', False)
+
+    height_limit = max_height
+    if force_pow2 and max_height >= 1:
+        height_limit = 2 ** int(math.floor(math.log2(max_height)))
+    # Pieces are only sure to be rotated if every engine can rotate them.
+    engines = options.get('engine', 'blf')
+    engines = (engines, ) if isinstance(engines, str) else tuple(engines)
+    is_rotated = options.get('enable_rotation', False) and all(engine in ROTATING_ENGINES for engine in engines)
+    for piece in pieces:
+        height = min(piece.size) if is_rotated else piece.size.height
+        if height + margin.top + margin.bottom > height_limit:
+            raise ValueError('The piece {} is taller than the maximum height {}.'.format(piece.uid, height_limit))
+
+    pages = list()
+    remaining = list(pieces)
+    while remaining:
+        width, height, regions = solve(
+            pieces=remaining,
+            container_width=container_width,
+            options=options,
+            executor=executor,
+            cache=cache
+        )
+        if height <= height_limit:
+            pages.append((width, height, regions))
+            break
+
+        kept = [region for region in regions if region.top + margin.top <= height_limit]
+        # The pieces lying across the limit may still fit into the gaps below it.
+        uid_to_piece = {piece.uid: piece for piece in remaining}
+        crossing = sorted(
+            (uid_to_piece[region.uid] for region in regions if region.bottom < height_limit < region.top + margin.top),
+            key=by_height
+        )
+        for piece in crossing:
+            try:
+                kept += blf.fill(
+                    pieces=[piece],
+                    regions=kept,
+                    container_size=blf.Size(width, height_limit),
                     options=options
-                ): solver.__name__
-                for solver in solvers
-            }
-            for future in futures.as_completed(future_to_name):
-                filling_rate, container_size, regions = future.result()
-                logger.debug(
-                    'Result of {}: fl={}, w={}, h={}'.format(
-                        future_to_name[future], filling_rate, container_size.width, container_size.height)
                 )
-                if filling_rate > best_filling_rate:
-                    best_filling_rate = filling_rate
-                    result = (container_size.width, container_size.height, regions)
+            except blf.LocationNotFoundError:
+                pass
+        # Otherwise no piece would ever be removed from the remaining pieces.
+        if not kept:
+            raise ValueError('No piece fits into the maximum height {}.'.format(height_limit))
+
+        container_size = calc_container_size(
+            container_width=width,
+            regions=kept,
+            margin=margin,
+            enable_auto_size=enable_auto_size,
+            force_pow2=force_pow2
+        )
+        pages.append((container_size.width, container_size.height, kept))
+        logger.debug('Page {}: {} of {} pieces.'.format(len(pages) - 1, len(kept), len(remaining)))
 
-    logger.debug('Final result: fl={}, w={}, h={}'.format(best_filling_rate, result[0], result[1]))
+        kept_uids = {region.uid for region in kept}
+        remaining = [piece for piece in remaining if piece.uid not in kept_uids]
 
-    return result
+    return pages
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+
+
+__all__ = [
+    'make_layout_key',
+    'LayoutCache',
+    'MetadataCache'
+]
+
+# The maximum number of parameters in a query, which is bounded by SQLite.
+_MAX_QUERY_PARAMETERS = 500
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_order(pieces):
+    '''Sort pieces by size. Pieces of the same size keep their input order.'''
+    return sorted(pieces, key=lambda piece: (piece.size.width, piece.size.height))
+
+
+def make_layout_key(pieces, container_width, options):
+    '''Make a key from the multiset of piece sizes, a container width and solver options.
+
+    Returns:
+        A hex digest, or None if the options cannot be hashed, e.g. when sort key functions are given.
+    '''
+    canonical_options = dict()
+    for key, value in options.items():
+        if callable(value) or (isinstance(value, (tuple, list)) and any(callable(item) for item in value)):
+            return None
+        canonical_options[key] = list(value) if isinstance(value, tuple) else value
+
+    data = {
+        'sizes': [list(piece.size) for piece in canonical_order(pieces)],
+        'container_width': container_width,
+        'options': canonical_options
+    }
+    text = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LayoutCache(object):
+    '''This class represents an on-disk cache of layouts with the least recently used eviction.
+
+    A layout is stored as the container size and (index, x, y, rotated) quadruples,
+    where the index is that of a piece in :func:`canonical_order`.
+    The database may be shared by concurrent builds.
+    '''
+    def __init__(self, filepath, max_entries=1024, timeout=30.0):
+        '''
+        Args:
+            filepath (str): A database file path, or ':memory:'.
+            max_entries (int): The maximum number of layouts kept.
+            timeout (float): Seconds to wait for the lock of another build.
+        '''
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filepath, timeout=timeout, check_same_thread=False)
+        # Readers are not blocked by a writer in the write-ahead log mode.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS layouts ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used INTEGER NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS layouts_last_used ON layouts (last_used)')
+        self._clock = self._connection.execute('SELECT MAX(last_used) FROM layouts').fetchone()[0] or 0
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM layouts').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get(self, key):
+        '''Return the layout stored for a key.
+
+        Returns:
+            container_width, container_height, list of (index, x, y, rotated), or None if not found.
+        '''
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM layouts WHERE key = ?', (key, )).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute('UPDATE layouts SET last_used = ? WHERE key = ?', (self._tick(), key))
+
+        value = json.loads(row[0])
+        return value['width'], value['height'], [tuple(placement) for placement in value['placements']]
+
+    def put(self, key, container_width, container_height, placements):
+        '''Store a layout and evict the least recently used ones beyond `max_entries`.'''
+        value = json.dumps({
+            'width': container_width,
+            'height': container_height,
+            'placements': [list(placement) for placement in placements]
+        })
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO layouts (key, value, last_used) VALUES (?, ?, ?)', (key, value, self._tick()))
+            num_evicted = self._connection.execute(
+                'DELETE FROM layouts WHERE key NOT IN (SELECT key FROM layouts ORDER BY last_used DESC LIMIT ?)',
+                (self._max_entries, )
+            ).rowcount
+        if num_evicted > 0:
+            logger.debug('Evicted {} layouts.'.format(num_evicted))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM layouts')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class MetadataCache(object):
+    '''This class represents an on-disk cache of image header information.
+
+    An entry is valid while the modification time, the change time and the byte length of the file are the same.
+    The database may be shared by concurrent builds.
+    '''
+    def __init__(self, filepath, timeout=30.0):
+        '''
+        Args:
+            filepath (str): A database file path, or ':memory:'.
+            timeout (float): Seconds to wait for the lock of another build.
+        '''
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filepath, timeout=timeout, check_same_thread=False)
+        # Readers are not blocked by a writer in the write-ahead log mode.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS images ('
+                'path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, ctime_ns INTEGER NOT NULL, size INTEGER NOT NULL, '
+                'width INTEGER NOT NULL, height INTEGER NOT NULL, has_alpha INTEGER NOT NULL)'
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_many(self, paths):
+        '''Look up absolute file paths.
+
+        Returns:
+            dict of path to (mtime_ns, ctime_ns, size, width, height, has_alpha) for the paths found.
+        '''
+        paths = list(paths)
+        result = dict()
+        with self._lock:
+            for i in range(0, len(paths), _MAX_QUERY_PARAMETERS):
+                chunk = paths[i:i + _MAX_QUERY_PARAMETERS]
+                rows = self._connection.execute(
+                    'SELECT path, mtime_ns, ctime_ns, size, width, height, has_alpha FROM images '
+                    'WHERE path IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk
+                )
+                for row in rows:
+                    result[row[0]] = row[1:6] + (bool(row[6]), )
+        return result
+
+    def put_many(self, entries):
+        '''Store (path, mtime_ns, ctime_ns, size, width, height, has_alpha) entries.'''
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO images (path, mtime_ns, ctime_ns, size, width, height, has_alpha) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [tuple(entry[0:6]) + (int(entry[6]), ) for entry in entries]
+            )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM images')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
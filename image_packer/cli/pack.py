@@ -3,7 +3,10 @@
 import argparse
 import logging
 import sys
+from .. import blf_solver
+from .. import cache
 from .. import packer
+from .. import png
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +33,12 @@ def nonnegative_normalized_float(x):
     return x
 
 
+def container_width(x):
+    if x == 'auto':
+        return x
+    return positive_integer(x)
+
+
 def required_length(nmin, nmax):
     class RequiredLength(argparse.Action):
         def __call__(self, parser, args, values, option_string=None):
@@ -69,10 +78,11 @@ def main():
     parser.add_argument(
         '-w',
         '--width',
-        type=positive_integer,
+        type=container_width,
         action='store',
         required=True,
-        help='Specifies a container width.'
+        help='Specifies a container width. '
+             'If "auto" is given, the width with the smallest container area is searched for.'
     )
 
     parser.add_argument(
@@ -125,6 +135,106 @@ def main():
         help='Specifies whether to force the paths in a configuration file to absolute paths.'
     )
 
+    parser.add_argument(
+        '--enable-rotation',
+        action='store_true',
+        help='Specifies whether to allow images to be rotated by 90 degrees for a denser packing. '
+             'Only the "blf" engine rotates images.'
+    )
+
+    parser.add_argument(
+        '--engine',
+        type=str,
+        nargs='+',
+        default=('blf', ),
+        choices=sorted(blf_solver.ENGINES.keys()),
+        action='store',
+        help='Specifies packing engines. If multiple engines are given, the densest result is used. '
+             'The "shelf" engine is the fastest.'
+    )
+
+    parser.add_argument(
+        '--max-height',
+        type=positive_integer,
+        action='store',
+        help='Specifies a maximum container height, e.g. the maximum texture size. '
+             'The images spilling over are packed into further pages written as "<output>_<page><ext>".'
+    )
+
+    parser.add_argument(
+        '--strip-height',
+        type=positive_integer,
+        action='store',
+        help='Specifies a height of strips to compose and write the output in, '
+             'which bounds the memory for very large outputs.'
+    )
+
+    parser.add_argument(
+        '--output-format',
+        type=str,
+        default='png',
+        choices=('png', 'raw'),
+        action='store',
+        help='Specifies an output image format. '
+             '"raw" writes uncompressed rows with a small header, to map into memory and upload directly.'
+    )
+
+    parser.add_argument(
+        '--compress-level',
+        type=int,
+        default=6,
+        choices=range(10),
+        action='store',
+        help='Specifies a zlib compression level of the output. '
+             '1 is the fastest, and 9 is the smallest.'
+    )
+
+    parser.add_argument(
+        '--optimize',
+        action='store_true',
+        help='Specifies whether to make the output as small as possible.'
+    )
+
+    parser.add_argument(
+        '--compress-strategy',
+        type=str,
+        default='default',
+        choices=sorted(png.STRATEGIES.keys()),
+        action='store',
+        help='Specifies a zlib strategy of the output.'
+    )
+
+    parser.add_argument(
+        '--encode-workers',
+        type=nonnegative_integer,
+        default=1,
+        action='store',
+        help='Specifies the number of threads encoding the output. '
+             'If other than 1, blocks of rows are deflated in parallel. 0 means the number of CPUs.'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Specifies whether to repaint only the images changed since the previous output.'
+    )
+
+    parser.add_argument(
+        '--cache',
+        type=str,
+        action='store',
+        help='Specifies a layout cache file path. '
+             'Layouts are reused for inputs with the same sizes and options.'
+    )
+
+    parser.add_argument(
+        '--metadata-cache',
+        type=str,
+        action='store',
+        help='Specifies an image metadata cache file path. '
+             'Unchanged input images are not opened again.'
+    )
+
     try:
         args = parser.parse_args()
     except SystemExit as e:
@@ -139,17 +249,36 @@ def main():
             'enable_auto_size': not args.disable_auto_size,
             'enable_vertical_flip': not args.disable_vertical_flip,
             'force_pow2': args.force_pow2,
-            'force_absolute_path': args.force_absolute_path
+            'force_absolute_path': args.force_absolute_path,
+            'engine': tuple(args.engine),
+            'incremental': args.incremental,
+            'strip_height': args.strip_height,
+            'compress_level': args.compress_level,
+            'optimize': args.optimize,
+            'compress_strategy': args.compress_strategy,
+            'encode_workers': args.encode_workers or None,
+            'output_format': args.output_format,
+            'max_height': args.max_height,
+            'enable_rotation': args.enable_rotation
         }
         if args.bg_color is not None:
             options['bg_color'] = tuple(args.bg_color)
 
-        packer.pack(
-            input_filepaths=args.input,
-            output_filepath=args.output,
-            container_width=args.width,
-            options=options
-        )
+        layout_cache = cache.LayoutCache(args.cache) if args.cache is not None else None
+        metadata_cache = cache.MetadataCache(args.metadata_cache) if args.metadata_cache is not None else None
+        try:
+            packer.pack(
+                input_filepaths=args.input,
+                output_filepath=args.output,
+                container_width=args.width,
+                options=options,
+                cache=layout_cache,
+                metadata_cache=metadata_cache
+            )
+        finally:
+            for opened_cache in (layout_cache, metadata_cache):
+                if opened_cache is not None:
+                    opened_cache.close()
         logger.info('The command terminated normally.')
         sys.exit(0)
     except Exception:
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent import futures
+from PIL import Image
+
+
+__all__ = [
+    'decode',
+    'iter_decoded',
+    'DecodedImageCache'
+]
+
+# The default bytes of decoded images held ahead of the consumer.
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Decoded images are estimated at four bytes per pixel.
+_BYTES_PER_PIXEL = 4
+
+
+def decode(filepath):
+    '''Open and decode an image.'''
+    # Open path as file to avoid ResourceWarning.
+    # https://github.com/python-pillow/Pillow/issues/835
+    with open(filepath, 'rb') as fp:
+        im = Image.open(fp=fp)
+        im.load()
+    return im
+
+
+class DecodedImageCache(object):
+    '''This class represents a cache of decoded images bounded by bytes, with the least recently used eviction.
+
+    An entry is valid while the modification time and the byte length of the file are the same.
+    The cached images are shared, so they must not be modified. It is safe to use from multiple threads.
+
+    Args:
+        max_bytes (int): The maximum bytes of the decoded images kept.
+    '''
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Each absolute path maps to (stat, image, bytes).
+        self._entries = OrderedDict()
+        self._num_bytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def num_bytes(self):
+        '''The bytes of the decoded images kept.'''
+        with self._lock:
+            return self._num_bytes
+
+    @staticmethod
+    def _stat(filepath):
+        stat = os.stat(filepath)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, filepath):
+        '''Return the decoded image of a file if it is cached and has not changed, otherwise None.'''
+        path = os.path.abspath(filepath)
+        stat = self._stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            if entry[0] != stat:
+                self._num_bytes -= entry[2]
+                del self._entries[path]
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def decode(self, filepath):
+        '''Return the decoded image of a file, decoding and caching it if necessary.'''
+        im = self.get(filepath)
+        if im is not None:
+            return im
+
+        path = os.path.abspath(filepath)
+        # The file is stated first, so a file changed while decoding is decoded again next time.
+        stat = self._stat(path)
+        im = decode(path)
+        num_bytes = im.width * im.height * len(im.getbands())
+        if num_bytes > self._max_bytes:
+            return im
+
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._num_bytes -= entry[2]
+            self._entries[path] = (stat, im, num_bytes)
+            self._num_bytes += num_bytes
+            while self._num_bytes > self._max_bytes:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self._num_bytes -= evicted_bytes
+        return im
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._num_bytes = 0
+
+
+def iter_decoded(filepaths, sizes, max_workers=None, memory_budget=DEFAULT_MEMORY_BUDGET, cache=None):
+    '''Decode images on a pool of threads ahead of the consumer and yield them in order.
+
+    The images decoded or being decoded ahead are bounded by `memory_budget` bytes,
+    except that one image is always decoded even if it is larger.
+
+    Args:
+        filepaths (list(str)):
+        sizes (list(tuple(int, int))): The width and height of each image, to estimate its memory.
+        max_workers (int): The number of threads. The default is the number of processors.
+        memory_budget (int):
+        cache (:class:`DecodedImageCache`): If given, the images are decoded through it.
+    '''
+    filepaths = list(filepaths)
+    costs = [width * height * _BYTES_PER_PIXEL for width, height in sizes]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    decode_ = decode if cache is None else cache.decode
+
+    pending = deque()
+    in_flight = 0
+    next_index = 0
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while next_index < len(filepaths) or pending:
+                while next_index < len(filepaths) and (not pending or in_flight + costs[next_index] <= memory_budget):
+                    pending.append((executor.submit(decode_, filepaths[next_index]), costs[next_index]))
+                    in_flight += costs[next_index]
+                    next_index += 1
+
+                future, cost = pending.popleft()
+                yield future.result()
+                in_flight -= cost
+        finally:
+            # The consumer may stop early.
+            for future, _ in pending:
+                future.cancel()
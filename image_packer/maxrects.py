@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import math
+import sys
+from collections import OrderedDict
+from . import blf
+
+
+__all__ = [
+    'HEURISTICS',
+    'maxrects'
+]
+
+# Placement heuristics.
+HEURISTICS = (
+    # Best short side fit.
+    'bssf',
+    # Best area fit.
+    'baf',
+    # Bottom-left.
+    'bl',
+    # Contact point.
+    'cp',
+)
+
+
+class _MaxRects(object):
+    '''This class represents a bin managed as a set of maximal free rectangles.
+
+    Pieces are grown by the spacing between them, so the bin works in a coordinate system without margins.
+    The bin grows upwards whenever a rectangle does not fit.
+    Free rectangles are stored as (left, bottom, right, top).
+    '''
+    def __init__(self, width, height, heuristic):
+        self._width = width
+        self._height = height
+        self._heuristic = heuristic
+        self._free_rects = [(0, 0, width, height)]
+        # Used rectangles are indexed only for the contact point heuristic.
+        self._used_rects = blf.RegionIndex(cell_size=max(1, width // 16)) if heuristic == 'cp' else None
+
+    def _contact_score(self, x, y, width, height):
+        score = 0
+        if x == 0 or x + width == self._width:
+            score += height
+        if y == 0:
+            score += width
+
+        seen = set()
+        for rect in self._used_rects.query(x - 1, y - 1, x + width + 1, y + height + 1):
+            if rect.uid in seen:
+                continue
+            seen.add(rect.uid)
+            if rect.right == x or rect.left == x + width:
+                score += max(0, min(rect.top, y + height) - max(rect.bottom, y))
+            if rect.top == y or rect.bottom == y + height:
+                score += max(0, min(rect.right, x + width) - max(rect.left, x))
+        return score
+
+    def _score(self, free_rect, width, height):
+        '''Score a placement at the bottom-left of a free rectangle. Lower is better.'''
+        left, bottom, right, top = free_rect
+        leftover_w, leftover_h = right - left - width, top - bottom - height
+        if self._heuristic == 'bssf':
+            return min(leftover_w, leftover_h), max(leftover_w, leftover_h)
+        if self._heuristic == 'baf':
+            return (right - left) * (top - bottom) - width * height, min(leftover_w, leftover_h)
+        if self._heuristic == 'bl':
+            return bottom + height, left
+        return -self._contact_score(left, bottom, width, height), bottom, left
+
+    def _find(self, width, height):
+        best_rect, best_score = None, None
+        for free_rect in self._free_rects:
+            if width <= free_rect[2] - free_rect[0] and height <= free_rect[3] - free_rect[1]:
+                score = self._score(free_rect, width, height)
+                if best_score is None or score < best_score:
+                    best_rect, best_score = free_rect, score
+        return best_rect
+
+    @staticmethod
+    def _remove_contained(rects, others):
+        '''Remove the rectangles contained in one of the others.
+
+        If `others` is `rects` itself, a rectangle is not tested against itself.
+        '''
+        if others is rects:
+            # Remove the duplicates first, so that equal rectangles do not remove each other.
+            rects = others = list(OrderedDict.fromkeys(rects))
+
+        result = list()
+        for rect in rects:
+            left, bottom, right, top = rect
+            for other in others:
+                if other[0] <= left and other[1] <= bottom and right <= other[2] and top <= other[3] \
+                        and other is not rect:
+                    break
+            else:
+                result.append(rect)
+        return result
+
+    def _grow(self, height):
+        '''Make the bin taller by `height`.'''
+        old_height = self._height
+        self._height += height
+        free_rects = [
+            (left, bottom, right, self._height if top == old_height else top)
+            for left, bottom, right, top in self._free_rects
+        ]
+        free_rects.append((0, old_height, self._width, self._height))
+        self._free_rects = self._remove_contained(free_rects, free_rects)
+
+    def _split(self, x, y, width, height):
+        '''Split the free rectangles that intersect a rectangle placed at (x, y).'''
+        right, top = x + width, y + height
+        kept, new_rects = list(), list()
+        for free_rect in self._free_rects:
+            f_left, f_bottom, f_right, f_top = free_rect
+            if x >= f_right or right <= f_left or y >= f_top or top <= f_bottom:
+                kept.append(free_rect)
+                continue
+            if x > f_left:
+                new_rects.append((f_left, f_bottom, x, f_top))
+            if right < f_right:
+                new_rects.append((right, f_bottom, f_right, f_top))
+            if y > f_bottom:
+                new_rects.append((f_left, f_bottom, f_right, y))
+            if top < f_top:
+                new_rects.append((f_left, top, f_right, f_top))
+
+        # Only the new rectangles can be contained in others or contain the kept ones.
+        new_rects = self._remove_contained(self._remove_contained(new_rects, new_rects), kept)
+        kept = self._remove_contained(kept, new_rects)
+        self._free_rects = kept + new_rects
+
+    def prune(self, min_width, min_height):
+        '''Drop the free rectangles that are too small for any remaining piece.'''
+        self._free_rects = [
+            rect for rect in self._free_rects
+            if rect[2] - rect[0] >= min_width and rect[3] - rect[1] >= min_height
+        ]
+
+    def insert(self, uid, width, height):
+        '''Place a rectangle and return its position.'''
+        if width > self._width:
+            raise blf.LocationNotFoundError
+
+        free_rect = self._find(width, height)
+        while free_rect is None:
+            self._grow(max(height, self._height // 2))
+            free_rect = self._find(width, height)
+
+        x, y = free_rect[0], free_rect[1]
+        self._split(x, y, width, height)
+        if self._used_rects is not None:
+            self._used_rects.add(blf.Region.from_position_and_size(uid, x, y, width, height))
+        return x, y
+
+
+def maxrects(pieces, container_width, options=None, heuristic='bssf'):
+    '''Run all iterations with the MaxRects algorithm.
+
+    Args:
+        pieces (list(:class:`image_packer.blf.Piece`)):
+        container_width (int):
+        options (dict):
+        heuristic (str): One of `HEURISTICS`.
+
+    Returns:
+        container_width, list(:class:`image_packer.blf.Region`)
+    '''
+    if heuristic not in HEURISTICS:
+        raise ValueError('Unknown heuristic: {}'.format(heuristic))
+
+    container_width, correction_info = blf.resolve_options(pieces, container_width, options)
+    margin = correction_info.margin
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+
+    bin_width = container_width - margin.left - margin.right + offset_x
+    # Start from the height the pieces would need without any waste.
+    total_area = sum((piece.size.width + offset_x) * (piece.size.height + offset_y) for piece in pieces)
+    bin_height = max(1, int(math.ceil(total_area / max(1, bin_width))))
+    packer = _MaxRects(width=bin_width, height=bin_height, heuristic=heuristic)
+
+    size_bounds = blf.remaining_size_bounds(pieces)
+    last_bounds = (sys.maxsize, sys.maxsize)
+    is_cancelled = (options or {}).get('is_cancelled')
+
+    regions = list()
+    for i, piece in enumerate(pieces):
+        blf.check_cancelled(is_cancelled, i)
+        if size_bounds[i][0:2] != last_bounds:
+            last_bounds = size_bounds[i][0:2]
+            packer.prune(min_width=last_bounds[0] + offset_x, min_height=last_bounds[1] + offset_y)
+
+        x, y = packer.insert(uid=piece.uid, width=piece.size.width + offset_x, height=piece.size.height + offset_y)
+        regions.append(
+            blf.Region.from_position_and_size(
+                uid=piece.uid,
+                x=x + margin.left,
+                y=y + margin.bottom,
+                width=piece.size.width,
+                height=piece.size.height
+            )
+        )
+
+    return container_width, regions
@@ -2,14 +2,19 @@
 # -*- coding: utf-8 -*-
 import fnmatch
 import glob
+import hashlib
 import json
 import logging
 import os
-import uuid
 from collections import OrderedDict
+from concurrent import futures
 from PIL import Image
 from . import blf
 from . import blf_solver
+from . import decode
+from . import png
+from . import raw
+from . import probe
 
 
 __all__ = ['pack']
@@ -48,11 +53,29 @@ def distinct_filepaths(filepaths, allowed_extensions):
                 yield os.path.relpath(path)
 
 
+def fingerprint(filepath, previous=None):
+    '''Make a fingerprint of a file to detect changes of its content.
+
+    The content hash of a previous fingerprint is reused if the modification time and the size are the same.
+    '''
+    stat = os.stat(filepath)
+    if previous is not None and previous.get('mtime') == stat.st_mtime and previous.get('size') == stat.st_size:
+        sha1 = previous['sha1']
+    else:
+        with open(filepath, 'rb') as fp:
+            sha1 = hashlib.sha1(fp.read()).hexdigest()
+
+    return OrderedDict([('mtime', stat.st_mtime), ('size', stat.st_size), ('sha1', sha1)])
+
+
 class Packer(object):
     '''The Packer class packs multiple images of different sizes or formats into one image.
 
     Args:
         filepaths (list(str)): List of input image file paths.
+        metadata_cache (:class:`image_packer.cache.MetadataCache`): If given, unchanged images are not opened.
+        image_cache (:class:`image_packer.decode.DecodedImageCache`): If given, images are decoded once
+            and shared by the scan and the composition, also across packers.
     '''
     _ALLOWED_EXTENSIONS = {'.png', '.bmp', '.jpg'}
 
@@ -67,42 +90,117 @@ class Packer(object):
         # If true, the power-of-two rule is forced.
         'force_pow2': False,
         # If true, all paths are forced to absolute path.
-        'force_absolute_path': False
+        'force_absolute_path': False,
+        # The name of a packing engine in `blf_solver.ENGINES`, or a sequence of names to try them all.
+        'engine': 'blf',
+        # Names in `blf_solver.ORDERINGS` or sort key functions applied to the inputs.
+        'orderings': ('height', 'area', 'height_width'),
+        # If given, stop as soon as a result reaches this filling rate.
+        'target_filling_rate': None,
+        # If true or false, forces parallel or serial packing. If None, the faster one is estimated.
+        'parallel': None,
+        # The number of workers of the executor given to `pack`, for the estimate. If None, the number of CPUs.
+        'num_workers': None,
+        # If true, only the images changed since the previous output are repainted onto it.
+        'incremental': False,
+        # The bytes of images decoded ahead of the composition.
+        'decode_memory_budget': decode.DEFAULT_MEMORY_BUDGET,
+        # If given, the image is composed and written in strips of this height,
+        # so that the whole image is never held in memory. The previous image is not reused in this mode.
+        'strip_height': None,
+        # The zlib compression level of the output from 0 to 9.
+        'compress_level': 6,
+        # If true, the output is made as small as possible, at the compression level 9.
+        'optimize': False,
+        # The name of a zlib strategy in `png.STRATEGIES`.
+        'compress_strategy': 'default',
+        # The number of threads deflating the output. If other than 1, the output is encoded
+        # in independent blocks by `png.PNGWriter` instead of Pillow. If None, the number of CPUs.
+        'encode_workers': 1,
+        # 'png', or 'raw' for uncompressed rows to map into memory, see `raw.RawWriter`.
+        'output_format': 'png',
+        # If given, the images spilling over this container height are packed into further pages,
+        # and the pages are written as `<name>_<page><ext>`.
+        'max_height': None,
+        # If true, images may be placed rotated by 90 degrees clockwise. Only the 'blf' engine rotates images.
+        'enable_rotation': False
     }
 
-    def __init__(self, filepaths):
+    def __init__(self, filepaths, metadata_cache=None, image_cache=None):
         # Ensure plugins are fully loaded so that Image.EXTENSION is populated.
         Image.init()
 
         self._uid_to_filepath = dict()
         self._pieces = list()
         self._has_alpha = False
-
+        self._next_uid = 0
+        # The current layout as a list of pages of (container_width, container_height, regions),
+        # set by `pack` or `load`.
+        self._pages = None
+        # If true, the pages are written as `<name>_<page><ext>` even if there is only one.
+        self._is_paged = False
+        self._container_width = None
+        self._options = None
+        self._metadata_cache = metadata_cache
+        self._image_cache = image_cache
+
+        self._add_pieces(filepaths)
+
+    def _add_piece(self, filepath, width, height, has_alpha):
+        uid = self._next_uid
+        self._next_uid += 1
+        self._uid_to_filepath[uid] = filepath
+        piece = blf.Piece(uid=uid, size=blf.Size(width, height))
+        self._pieces.append(piece)
+        if has_alpha:
+            self._has_alpha = True
+        return piece
+
+    def _add_pieces(self, filepaths):
+        '''Add the images that have not been added yet and return their pieces.'''
+        added_filepaths = {os.path.abspath(filepath) for filepath in self._uid_to_filepath.values()}
         allowed_extensions = {ext for ext in self._ALLOWED_EXTENSIONS if ext in Image.EXTENSION}
-        for filepath in distinct_filepaths(filepaths=filepaths, allowed_extensions=allowed_extensions):
-            with Image.open(fp=filepath) as im:
-                width = im.width
-                height = im.height
-                uid = uuid.uuid4()
-                self._uid_to_filepath[uid] = filepath
-                self._pieces.append(blf.Piece(uid=uid, size=blf.Size(width, height)))
-                if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
-                    self._has_alpha = True
-
-    def pack(self, filepath, container_width, options=None):
-        '''Packs multiple images of different sizes or formats into one image.
 
-        Args:
-            filepath (str): An output image file path.
-            container_width (int):
-            options (dict):
+        new_filepaths = [
+            filepath
+            for filepath in distinct_filepaths(filepaths=filepaths, allowed_extensions=allowed_extensions)
+            if os.path.abspath(filepath) not in added_filepaths
+        ]
+        return [
+            self._add_piece(filepath, info.width, info.height, info.has_alpha)
+            for filepath, info in zip(new_filepaths, self._probe(new_filepaths))
+        ]
+
+    def _probe(self, filepaths):
+        '''Read the information of images, from the decoded images in the cache if possible.
+
+        The others are probed on a pool of threads, reading only the headers. The order is kept.
+        '''
+        infos = [None] * len(filepaths)
+        if self._image_cache is not None:
+            for i, filepath in enumerate(filepaths):
+                im = self._image_cache.get(filepath)
+                if im is not None:
+                    infos[i] = probe.ImageInfo(im.width, im.height, probe.has_alpha(im))
+
+        missing = [i for i, info in enumerate(infos) if info is None]
+        for i, info in zip(missing, probe.probe_all([filepaths[i] for i in missing], cache=self._metadata_cache)):
+            infos[i] = info
+        return infos
+
+    @classmethod
+    def _resolve_options(cls, options):
+        '''Fill in the default options and derive the options of :func:`blf_solver.solve`.
+
+        Returns:
+            options, blf_options
         '''
         if options is None:
-            options = self._DEFAULT_OPTIONS
+            options = cls._DEFAULT_OPTIONS
         else:
             options = {
-                key: options[key] if key in options else self._DEFAULT_OPTIONS[key]
-                for key in self._DEFAULT_OPTIONS.keys()
+                key: options[key] if key in options else cls._DEFAULT_OPTIONS[key]
+                for key in cls._DEFAULT_OPTIONS.keys()
             }
 
         margin_ = options['margin']
@@ -117,39 +215,296 @@ class Packer(object):
             'margin': margin,
             'collapse_margin': options['collapse_margin'],
             'enable_auto_size': options['enable_auto_size'],
-            'force_pow2': options['force_pow2']
+            'force_pow2': options['force_pow2'],
+            'engine': options['engine'],
+            'orderings': options['orderings'],
+            'target_filling_rate': options['target_filling_rate'],
+            'parallel': options['parallel'],
+            'num_workers': options['num_workers'],
+            'enable_rotation': options['enable_rotation']
         }
 
-        container_width, container_height, regions = blf_solver.solve(
+        return options, blf_options
+
+    def pack(self, filepath, container_width, options=None, executor=None, cache=None):
+        '''Packs multiple images of different sizes or formats into one image.
+
+        Args:
+            filepath (str): An output image file path.
+            container_width (int or str): A width or 'auto' to search for the smallest container.
+            options (dict):
+            executor (:class:`concurrent.futures.Executor`): Runs the packing of large inputs.
+                The shared pool of :mod:`blf_solver` is used if not given.
+            cache (:class:`image_packer.cache.LayoutCache`): Reuses the layouts of inputs with the same sizes.
+        '''
+        options, blf_options = self._resolve_options(options)
+
+        self._container_width = container_width
+        self._options = options
+        self._pages = self._solve(blf_options, executor=executor, cache=cache)
+        self._is_paged = options['max_height'] is not None
+
+        self.save(filepath)
+
+    def _solve(self, blf_options, executor=None, cache=None):
+        '''Pack all pieces into pages.'''
+        if self._options['max_height'] is None:
+            return [
+                blf_solver.solve(
+                    pieces=self._pieces,
+                    container_width=self._container_width,
+                    options=blf_options,
+                    executor=executor,
+                    cache=cache
+                )
+            ]
+        return blf_solver.solve_pages(
             pieces=self._pieces,
-            container_width=container_width,
-            options=blf_options
+            container_width=self._container_width,
+            max_height=self._options['max_height'],
+            options=blf_options,
+            executor=executor,
+            cache=cache
         )
 
-        self._save_image(
-            filepath=filepath,
-            container_width=container_width,
-            container_height=container_height,
-            regions=regions,
-            options=options
-        )
+    @classmethod
+    def load(cls, filepath, options=None, metadata_cache=None, image_cache=None):
+        '''Load a layout from a configuration file written by `pack` or `save`.
+
+        Images whose sizes have changed since are placed again.
+
+        Args:
+            filepath (str): A configuration file path.
+            options (dict): The options the layout was packed with.
+            metadata_cache (:class:`image_packer.cache.MetadataCache`):
+            image_cache (:class:`image_packer.decode.DecodedImageCache`):
+
+        Returns:
+            :class:`Packer`
+        '''
+        with open(filepath, 'r', encoding='utf-8') as fp:
+            config = json.load(fp)
+
+        packer = cls(filepaths=(), metadata_cache=metadata_cache, image_cache=image_cache)
+        packer._options, _ = cls._resolve_options(options)
+        packer._is_paged = 'pages' in config or packer._options['max_height'] is not None
+        page_sizes = [(page['width'], page['height']) for page in config.get('pages', (config, ))]
+        packer._container_width = page_sizes[0][0]
+        enable_vertical_flip = packer._options['enable_vertical_flip']
+
+        page_regions = [list() for _ in page_sizes]
+        resized_pieces = list()
+        values = list(config['regions'].values())
+        infos = packer._probe([value['filepath'] for value in values])
+        for value, info in zip(values, infos):
+            piece = packer._add_piece(value['filepath'], info.width, info.height, info.has_alpha)
+            rotated = value.get('rotated', False)
+            placed_size = (piece.size.height, piece.size.width) if rotated else tuple(piece.size)
+            if placed_size != (value['width'], value['height']):
+                resized_pieces.append(piece)
+                continue
+
+            page = value.get('page', 0)
+            container_height = page_sizes[page][1]
+            page_regions[page].append(
+                blf.Region.from_position_and_size(
+                    uid=piece.uid,
+                    x=value['x'],
+                    y=value['y'] if enable_vertical_flip else container_height - value['y'] - value['height'],
+                    width=value['width'],
+                    height=value['height'],
+                    rotated=rotated
+                )
+            )
+
+        packer._pages = [(width, height, regions) for (width, height), regions in zip(page_sizes, page_regions)]
+        if resized_pieces:
+            packer._place(resized_pieces)
+
+        return packer
+
+    def _place(self, pieces):
+        '''Place new pieces into the free space of the first page they fit into,
+        or pack all pieces again if they do not fit.
+
+        Returns:
+            True if the placed regions are kept.
+        '''
+        _, blf_options = self._resolve_options(self._options)
+        pieces = sorted(pieces, key=blf_solver.by_height)
+        for page, (container_width, container_height, regions) in enumerate(self._pages):
+            try:
+                new_regions = blf.fill(
+                    pieces=pieces,
+                    regions=regions,
+                    container_size=blf.Size(container_width, container_height),
+                    options=blf_options
+                )
+            except blf.LocationNotFoundError:
+                continue
+            self._pages[page] = (container_width, container_height, regions + new_regions)
+            return True
+
+        logger.info('The new images do not fit into the free space, so all images are packed again.')
+        self._pages = self._solve(blf_options)
+        return False
+
+    def add(self, filepaths):
+        '''Add images to the current layout.
+
+        The images are placed into the free space without moving the others, if possible.
+        Otherwise, all images are packed again.
+
+        Args:
+            filepaths (list(str)): List of input image file paths.
+
+        Returns:
+            True if the placed images have not moved.
+        '''
+        pieces = self._add_pieces(filepaths)
+        if self._pages is None:
+            return False
+        if not pieces:
+            return True
+        return self._place(pieces)
+
+    def remove(self, filepaths):
+        '''Remove images. Their space is reused by the images added later.
+
+        Args:
+            filepaths (list(str)): List of image file paths, which may contain Unix shell-style wildcards.
+
+        Returns:
+            The number of the removed images.
+        '''
+        patterns = [os.path.normpath(os.path.abspath(filepath)) for filepath in filepaths]
+        removed_uids = {
+            uid for uid, filepath in self._uid_to_filepath.items()
+            if any(fnmatch.fnmatch(os.path.normpath(os.path.abspath(filepath)), pattern) for pattern in patterns)
+        }
+
+        for uid in removed_uids:
+            del self._uid_to_filepath[uid]
+        self._pieces = [piece for piece in self._pieces if piece.uid not in removed_uids]
+        if self._pages is not None:
+            self._pages = [
+                (container_width, container_height, [region for region in regions if region.uid not in removed_uids])
+                for container_width, container_height, regions in self._pages
+            ]
+
+        return len(removed_uids)
+
+    def save(self, filepath):
+        '''Save the current layout as images and a configuration file.
+
+        If the `max_height` option is given, the pages are rendered in parallel as `<name>_<page><ext>`.
+
+        Args:
+            filepath (str): An output image file path.
+        '''
+        if self._pages is None:
+            raise ValueError('There is no layout to save. Call pack or load first.')
+
+        # Pages may be added by packing again.
+        self._is_paged = self._is_paged or len(self._pages) > 1
+        if not self._is_paged:
+            image_filepaths = [filepath]
+        else:
+            image_filepaths = [self._page_filepath(filepath, page) for page in range(len(self._pages))]
+
+        previous_configs = [None] * len(self._pages)
+        fingerprints = None
+        if self._options['incremental']:
+            previous_configs = self._load_previous_configurations(filepath, image_filepaths)
+            previous_fingerprints = {
+                os.path.abspath(value['filepath']): value.get('fingerprint')
+                for previous_config in previous_configs if previous_config is not None
+                for value in previous_config['regions'].values()
+            }
+            fingerprints = dict()
+            for _, _, regions in self._pages:
+                for region in regions:
+                    region_filepath = self._uid_to_filepath[region.uid]
+                    fingerprints[region.uid] = fingerprint(
+                        region_filepath, previous_fingerprints.get(os.path.abspath(region_filepath)))
+
+        def save_page(page):
+            container_width, container_height, regions = self._pages[page]
+            self._save_image(
+                filepath=image_filepaths[page],
+                container_width=container_width,
+                container_height=container_height,
+                regions=regions,
+                options=self._options,
+                previous_config=previous_configs[page],
+                fingerprints=fingerprints
+            )
+
+        if len(self._pages) > 1:
+            with futures.ThreadPoolExecutor(max_workers=min(len(self._pages), os.cpu_count() or 1)) as executor:
+                list(executor.map(save_page, range(len(self._pages))))
+        else:
+            save_page(0)
 
         self._save_configuration(
             filepath=os.path.splitext(filepath)[0],
-            image_filepath=os.path.normpath(filepath),
-            container_width=container_width,
-            container_height=container_height,
-            regions=regions,
-            options=options
+            image_filepaths=[os.path.normpath(image_filepath) for image_filepath in image_filepaths],
+            options=self._options,
+            fingerprints=fingerprints
         )
 
+    @staticmethod
+    def _page_filepath(filepath, page):
+        '''Return the image file path of a page.'''
+        root, ext = os.path.splitext(filepath)
+        return '{}_{}{}'.format(root, page, ext)
+
+    @staticmethod
+    def _config_box(value):
+        '''Return the box of a region in a configuration file as (left, upper, right, lower) of the image.'''
+        return value['x'], value['y'], value['x'] + value['width'], value['y'] + value['height']
+
+    @staticmethod
+    def _load_previous_configurations(filepath, image_filepaths):
+        '''Load the configuration of each page of the previous output, if both the image and the configuration exist.
+
+        Returns:
+            A list of configurations with the width, the height, the background color and the regions of a page,
+            or None for the pages without a previous output.
+        '''
+        previous_configs = [None] * len(image_filepaths)
+        config_filepath = os.path.splitext(filepath)[0] + '.json'
+        if not os.path.exists(config_filepath):
+            return previous_configs
+        with open(config_filepath, 'r', encoding='utf-8') as fp:
+            config = json.load(fp)
+
+        pages = config.get('pages', (config, ))
+        for page, image_filepath in enumerate(image_filepaths):
+            if page >= len(pages) or not os.path.exists(image_filepath) \
+                    or os.path.abspath(pages[page]['filepath']) != os.path.abspath(image_filepath):
+                continue
+            previous_config = {
+                'width': pages[page]['width'],
+                'height': pages[page]['height'],
+                'regions': {
+                    key: value for key, value in config['regions'].items() if value.get('page', 0) == page
+                }
+            }
+            if 'bg_color' in config:
+                previous_config['bg_color'] = config['bg_color']
+            previous_configs[page] = previous_config
+        return previous_configs
+
     def _save_image(
         self,
         filepath,
         container_width,
         container_height,
         regions,
-        options
+        options,
+        previous_config=None,
+        fingerprints=None
     ):
         bg_color_ = options['bg_color']
         assert isinstance(bg_color_, tuple) and (3 <= len(bg_color_) <= 4)
@@ -157,73 +512,232 @@ class Packer(object):
         if len(bg_color) == 3:
             bg_color += (255,)
 
-        if self._has_alpha:
-            blank_image = Image.new(
-                mode='RGBA',
-                size=(container_width, container_height),
-                color=bg_color
-            )
-        else:
-            blank_image = Image.new(
-                mode='RGB',
-                size=(container_width, container_height),
-                color=bg_color[0:3]
-            )
+        mode = 'RGBA' if self._has_alpha else 'RGB'
+        if mode == 'RGB':
+            bg_color = bg_color[0:3]
 
         enable_vertical_flip = options['enable_vertical_flip']
 
+        boxes = dict()
         for region in regions:
             x = region.left
             if enable_vertical_flip:
                 y = region.bottom
             else:
                 y = container_height - region.top
+            boxes[region.uid] = (x, y, x + region.width, y + region.height)
+
+        if options['strip_height'] is not None:
+            self._save_image_in_strips(
+                filepath=filepath,
+                container_width=container_width,
+                container_height=container_height,
+                regions=regions,
+                boxes=boxes,
+                mode=mode,
+                bg_color=bg_color,
+                options=options
+            )
+            return
 
-            input_filepath = self._uid_to_filepath.get(region.uid)
-            # Open path as file to avoid ResourceWarning.
-            # https://github.com/python-pillow/Pillow/issues/835
-            with open(input_filepath, 'rb') as fp:
-                im = Image.open(fp=fp)
-                blank_image.paste(im=im, box=(x, y))
+        blank_image = None
+        if previous_config is not None \
+                and (previous_config['width'], previous_config['height']) == (container_width, container_height) \
+                and tuple(previous_config.get('bg_color', ())) == tuple(bg_color_):
+            previous_image = self._load_image(filepath, options)
+            if previous_image.mode == mode:
+                blank_image = previous_image
 
-        blank_image.save(fp=filepath, format='PNG')
+        if blank_image is None:
+            blank_image = Image.new(
+                mode=mode,
+                size=(container_width, container_height),
+                color=bg_color
+            )
+            dirty_regions = regions
+        else:
+            # The regions at the same place with the same content are kept, and the others are cleared.
+            previous_regions = {
+                os.path.abspath(value['filepath']): value for value in previous_config['regions'].values()
+            }
+            kept_boxes = set()
+            dirty_regions = list()
+            for region in regions:
+                previous = previous_regions.get(os.path.abspath(self._uid_to_filepath[region.uid]))
+                if previous is not None and self._config_box(previous) == boxes[region.uid] \
+                        and (previous.get('fingerprint') or {}).get('sha1') == fingerprints[region.uid]['sha1']:
+                    kept_boxes.add(boxes[region.uid])
+                else:
+                    dirty_regions.append(region)
+
+            for previous in previous_regions.values():
+                box = self._config_box(previous)
+                if box not in kept_boxes:
+                    blank_image.paste(bg_color, box)
+            logger.debug('Repainting {} of {} regions.'.format(len(dirty_regions), len(regions)))
+
+        # The images are decoded ahead on a pool of threads, and pasted in the order of the regions.
+        images = decode.iter_decoded(
+            filepaths=[self._uid_to_filepath[region.uid] for region in dirty_regions],
+            sizes=[(region.width, region.height) for region in dirty_regions],
+            memory_budget=options['decode_memory_budget'],
+            cache=self._image_cache
+        )
+        for im, region in zip(images, dirty_regions):
+            blank_image.paste(im=self._orient(im, region), box=boxes[region.uid][0:2])
+
+        if options['output_format'] == 'raw':
+            with open(filepath, 'wb') as fp:
+                with raw.RawWriter(fp=fp, width=container_width, height=container_height, mode=mode) as writer:
+                    writer.write_rows(blank_image.tobytes())
+        elif options['encode_workers'] == 1:
+            blank_image.save(
+                fp=filepath,
+                format='PNG',
+                compress_level=options['compress_level'],
+                optimize=options['optimize'],
+                compress_type=png.STRATEGIES[options['compress_strategy']]
+            )
+        else:
+            with open(filepath, 'wb') as fp:
+                png.save(im=blank_image, fp=fp, **self._writer_options(options))
+
+    @staticmethod
+    def _orient(im, region):
+        '''Rotate an image by 90 degrees clockwise if it is placed rotated.'''
+        return im.transpose(Image.ROTATE_270) if region.rotated else im
+
+    @staticmethod
+    def _load_image(filepath, options):
+        '''Load an image written in the output format.'''
+        if options['output_format'] == 'raw':
+            with raw.RawImage(filepath) as raw_image:
+                return raw_image.to_image()
+        with open(filepath, 'rb') as fp:
+            image = Image.open(fp=fp)
+            image.load()
+        return image
+
+    @staticmethod
+    def _writer_options(options):
+        '''Return the arguments of `png.PNGWriter` for the options.'''
+        return {
+            'compress_level': 9 if options['optimize'] else options['compress_level'],
+            'strategy': options['compress_strategy'],
+            'max_workers': options['encode_workers']
+        }
 
-    def _save_configuration(
+    @classmethod
+    def _open_writer(cls, fp, width, height, mode, options):
+        '''Return a writer of rows in the output format.'''
+        if options['output_format'] == 'raw':
+            return raw.RawWriter(fp=fp, width=width, height=height, mode=mode)
+        return png.PNGWriter(fp=fp, width=width, height=height, mode=mode, **cls._writer_options(options))
+
+    def _save_image_in_strips(
         self,
         filepath,
-        image_filepath,
         container_width,
         container_height,
         regions,
+        boxes,
+        mode,
+        bg_color,
         options
+    ):
+        '''Compose the image in horizontal strips, writing each strip as soon as it is complete.
+
+        Only a strip and the images intersecting it are held in memory.
+        '''
+        strip_height = max(1, options['strip_height'])
+        # The regions are swept in the order of their upper edges, which is the order the strips need them in.
+        ordered_regions = sorted(regions, key=lambda region: boxes[region.uid][1])
+        images = decode.iter_decoded(
+            filepaths=[self._uid_to_filepath[region.uid] for region in ordered_regions],
+            sizes=[(region.width, region.height) for region in ordered_regions],
+            memory_budget=options['decode_memory_budget'],
+            cache=self._image_cache
+        )
+        pending = zip(images, ordered_regions)
+        next_item = next(pending, None)
+        # The regions intersecting the current strip.
+        active_items = list()
+
+        with open(filepath, 'wb') as fp:
+            writer = self._open_writer(
+                fp=fp,
+                width=container_width,
+                height=container_height,
+                mode=mode,
+                options=options
+            )
+            for upper in range(0, container_height, strip_height):
+                lower = min(upper + strip_height, container_height)
+                while next_item is not None and boxes[next_item[1].uid][1] < lower:
+                    im, region = next_item
+                    active_items.append((self._orient(im, region), region))
+                    next_item = next(pending, None)
+
+                strip = Image.new(mode=mode, size=(container_width, lower - upper), color=bg_color)
+                for im, region in active_items:
+                    left, top = boxes[region.uid][0:2]
+                    strip.paste(im=im, box=(left, top - upper))
+                writer.write_rows(strip.tobytes())
+
+                active_items = [item for item in active_items if boxes[item[1].uid][3] > lower]
+            writer.close()
+
+    def _save_configuration(
+        self,
+        filepath,
+        image_filepaths,
+        options,
+        fingerprints=None
     ):
         enable_vertical_flip = options['enable_vertical_flip']
         force_absolute_path = options['force_absolute_path']
+        is_paged = self._is_paged
 
         config = OrderedDict()
 
-        if force_absolute_path and not os.path.isabs(image_filepath):
-            image_filepath = os.path.abspath(image_filepath)
-
-        config['filepath'] = image_filepath
-        config['width'] = container_width
-        config['height'] = container_height
+        if force_absolute_path:
+            image_filepaths = [
+                image_filepath if os.path.isabs(image_filepath) else os.path.abspath(image_filepath)
+                for image_filepath in image_filepaths
+            ]
+
+        if is_paged:
+            config['pages'] = [
+                OrderedDict([('filepath', image_filepath), ('width', container_width), ('height', container_height)])
+                for image_filepath, (container_width, container_height, _) in zip(image_filepaths, self._pages)
+            ]
+        else:
+            config['filepath'] = image_filepaths[0]
+            config['width'], config['height'], _ = self._pages[0]
+        if fingerprints is not None:
+            config['bg_color'] = options['bg_color']
 
         config['regions'] = OrderedDict()
-        for i, region in enumerate(regions):
-            region_filepath = self._uid_to_filepath[region.uid]
-            if force_absolute_path and not os.path.isabs(region_filepath):
-                region_filepath = os.path.abspath(region_filepath)
-
-            config['regions'][str(i)] = OrderedDict(
-                [
-                    ('filepath', region_filepath),
-                    ('x', region.left),
-                    ('y', region.bottom if enable_vertical_flip else container_height - region.top),
-                    ('width', region.width),
-                    ('height', region.height)
-                ]
-            )
+        i = 0
+        for page, (_, container_height, regions) in enumerate(self._pages):
+            for region in regions:
+                region_filepath = self._uid_to_filepath[region.uid]
+                if force_absolute_path and not os.path.isabs(region_filepath):
+                    region_filepath = os.path.abspath(region_filepath)
+
+                value = OrderedDict([('filepath', region_filepath)])
+                if is_paged:
+                    value['page'] = page
+                value['x'] = region.left
+                value['y'] = region.bottom if enable_vertical_flip else container_height - region.top
+                value['width'] = region.width
+                value['height'] = region.height
+                if options['enable_rotation']:
+                    value['rotated'] = region.rotated
+                if fingerprints is not None:
+                    value['fingerprint'] = fingerprints[region.uid]
+                config['regions'][str(i)] = value
+                i += 1
 
         with open(filepath + '.json', 'w', encoding='utf-8') as fp:
             json.dump(config, fp, indent=4)
@@ -233,8 +747,18 @@ def pack(
     input_filepaths,
     output_filepath,
     container_width,
-    options=None
+    options=None,
+    executor=None,
+    cache=None,
+    metadata_cache=None,
+    image_cache=None
 ):
     '''Convenience function to create Packer object and call `pack` method.'''
-    packer = Packer(filepaths=input_filepaths)
-    packer.pack(filepath=output_filepath, container_width=container_width, options=options)
+    packer = Packer(filepaths=input_filepaths, metadata_cache=metadata_cache, image_cache=image_cache)
+    packer.pack(
+        filepath=output_filepath,
+        container_width=container_width,
+        options=options,
+        executor=executor,
+        cache=cache
+    )
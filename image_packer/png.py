@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import collections
+import os
+import struct
+import zlib
+from concurrent import futures
+
+
+__all__ = ['STRATEGIES', 'adler32_combine', 'PNGWriter', 'save']
+
+_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Color types of 8-bit images by mode.
+_COLOR_TYPES = {
+    'RGB': 2,
+    'RGBA': 6,
+}
+
+# The minimum bytes of an IDAT chunk written.
+_CHUNK_SIZE = 64 * 1024
+
+# The zlib strategies by name.
+STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman_only': zlib.Z_HUFFMAN_ONLY,
+    'rle': getattr(zlib, 'Z_RLE', 3),
+    'fixed': getattr(zlib, 'Z_FIXED', 4),
+}
+
+# The approximate bytes of rows deflated as a block by the parallel encoder.
+_BLOCK_SIZE = 256 * 1024
+
+# The bytes of the previous block used as the dictionary of the next one.
+_WINDOW_SIZE = 32 * 1024
+
+_ADLER_BASE = 65521
+
+
+def adler32_combine(adler1, adler2, len2):
+    '''Return the Adler-32 checksum of two concatenated sequences from the checksums of each.
+
+    This is ``adler32_combine()`` of zlib, which is not exposed by the zlib module.
+
+    Args:
+        adler1 (int): The checksum of the first sequence.
+        adler2 (int): The checksum of the second sequence.
+        len2 (int): The length of the second sequence.
+    '''
+    rem = len2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xffff) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + _ADLER_BASE - rem
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum2 >= (_ADLER_BASE << 1):
+        sum2 -= (_ADLER_BASE << 1)
+    if sum2 >= _ADLER_BASE:
+        sum2 -= _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _zlib_header(compress_level):
+    '''Return the zlib stream header for a 32K window.'''
+    cmf = 0x78
+    if compress_level < 2:
+        flevel = 0
+    elif compress_level < 6:
+        flevel = 1
+    elif compress_level == 6:
+        flevel = 2
+    else:
+        flevel = 3
+    flg = flevel << 6
+    flg += 31 - ((cmf << 8) + flg) % 31
+    return bytes((cmf, flg))
+
+
+def _deflate_block(data, dictionary, compress_level, strategy):
+    '''Deflate a block into a raw deflate stream ending at a byte boundary.
+
+    Returns:
+        tuple(bytes, int, int): The compressed data, and the Adler-32 and the length of the block.
+    '''
+    if dictionary:
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS, 9, strategy, dictionary)
+    else:
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS, 9, strategy)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(data), len(data)
+
+
+def write_chunk(fp, chunk_type, data):
+    '''Write a chunk with its length and CRC.'''
+    fp.write(struct.pack('>I', len(data)))
+    fp.write(chunk_type)
+    fp.write(data)
+    fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+
+class PNGWriter(object):
+    '''This class writes a PNG image row by row, so that the whole image is never held in memory.
+
+    The rows are not filtered.
+    If more than one worker is given, blocks of rows are deflated independently on a pool of threads,
+    each primed with the end of the previous block, and joined into one zlib stream like pigz.
+
+    Args:
+        fp: A binary file object.
+        width (int):
+        height (int):
+        mode (str): 'RGB' or 'RGBA'.
+        compress_level (int): The zlib compression level from 0 to 9.
+        strategy (str): The name of a zlib strategy in `STRATEGIES`.
+        max_workers (int): The number of threads deflating the rows. If None, the number of CPUs.
+    '''
+    def __init__(self, fp, width, height, mode, compress_level=6, strategy='default', max_workers=1):
+        if mode not in _COLOR_TYPES:
+            raise ValueError('Unsupported mode: {}'.format(mode))
+        if strategy not in STRATEGIES:
+            raise ValueError('Unsupported strategy: {}'.format(strategy))
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        self._fp = fp
+        self._width = width
+        self._height = height
+        self._row_bytes = width * len(mode)
+        self._num_rows = 0
+        self._compress_level = compress_level
+        self._strategy = STRATEGIES[strategy]
+        self._buffer = list()
+        self._buffer_size = 0
+
+        fp.write(_SIGNATURE)
+        write_chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, _COLOR_TYPES[mode], 0, 0, 0))
+
+        if max_workers > 1:
+            self._compressor = None
+            self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+            self._max_pending = 2 * max_workers
+            self._pending = collections.deque()
+            self._dictionary = b''
+            self._adler = zlib.adler32(b'')
+            self._write_data(_zlib_header(compress_level))
+        else:
+            self._compressor = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS, 9, self._strategy)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._executor is not None:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+
+    @property
+    def num_rows(self):
+        '''The number of rows written.'''
+        return self._num_rows
+
+    def _write_data(self, data, force=False):
+        if data:
+            self._buffer.append(data)
+            self._buffer_size += len(data)
+        if self._buffer_size >= _CHUNK_SIZE or (force and self._buffer_size > 0):
+            write_chunk(self._fp, b'IDAT', b''.join(self._buffer))
+            self._buffer = list()
+            self._buffer_size = 0
+
+    def write_rows(self, data):
+        '''Write rows of packed pixels from top to bottom, e.g. from :meth:`PIL.Image.Image.tobytes`.'''
+        num_rows, remainder = divmod(len(data), self._row_bytes)
+        if remainder != 0:
+            raise ValueError('The data is not a multiple of rows.')
+        if self._num_rows + num_rows > self._height:
+            raise ValueError('Too many rows.')
+
+        view = memoryview(data)
+        # Each row starts with the filter type, which is none.
+        filtered = bytearray((self._row_bytes + 1) * num_rows)
+        for i in range(num_rows):
+            start = i * (self._row_bytes + 1) + 1
+            filtered[start:start + self._row_bytes] = view[i * self._row_bytes:(i + 1) * self._row_bytes]
+        if self._executor is None:
+            self._write_data(self._compressor.compress(bytes(filtered)))
+        else:
+            self._submit_blocks(bytes(filtered))
+        self._num_rows += num_rows
+
+    def _submit_blocks(self, filtered):
+        rows_per_block = max(1, _BLOCK_SIZE // (self._row_bytes + 1))
+        block_size = rows_per_block * (self._row_bytes + 1)
+        for start in range(0, len(filtered), block_size):
+            block = filtered[start:start + block_size]
+            self._pending.append(self._executor.submit(
+                _deflate_block, block, self._dictionary, self._compress_level, self._strategy
+            ))
+            if len(block) >= _WINDOW_SIZE:
+                self._dictionary = block[-_WINDOW_SIZE:]
+            else:
+                self._dictionary = (self._dictionary + block)[-_WINDOW_SIZE:]
+            while len(self._pending) > self._max_pending:
+                self._write_block(self._pending.popleft())
+
+    def _write_block(self, future):
+        compressed, adler, size = future.result()
+        self._adler = adler32_combine(self._adler, adler, size)
+        self._write_data(compressed)
+
+    def close(self):
+        '''Finish the image. All rows must have been written.'''
+        if self._num_rows != self._height:
+            raise ValueError('{} of {} rows have been written.'.format(self._num_rows, self._height))
+        if self._executor is None:
+            self._write_data(self._compressor.flush(), force=True)
+        else:
+            try:
+                while self._pending:
+                    self._write_block(self._pending.popleft())
+            finally:
+                self._executor.shutdown(wait=True)
+            # An empty final block, and the checksum of the whole stream.
+            last = zlib.compressobj(self._compress_level, zlib.DEFLATED, -zlib.MAX_WBITS).flush()
+            self._write_data(last + struct.pack('>I', self._adler & 0xffffffff), force=True)
+        write_chunk(self._fp, b'IEND', b'')
+
+
+def save(im, fp, compress_level=6, strategy='default', max_workers=None):
+    '''Save an image as a PNG, deflating blocks of rows in parallel.
+
+    Args:
+        im (:class:`PIL.Image.Image`): An image in 'RGB' or 'RGBA' mode.
+        fp: A binary file object.
+        compress_level (int): The zlib compression level from 0 to 9.
+        strategy (str): The name of a zlib strategy in `STRATEGIES`.
+        max_workers (int): The number of threads deflating the rows. If None, the number of CPUs.
+    '''
+    width, height = im.size
+    rows_per_write = max(1, (4 * _BLOCK_SIZE) // max(1, width * len(im.mode)))
+    with PNGWriter(
+        fp=fp,
+        width=width,
+        height=height,
+        mode=im.mode,
+        compress_level=compress_level,
+        strategy=strategy,
+        max_workers=max_workers
+    ) as writer:
+        for upper in range(0, height, rows_per_write):
+            lower = min(upper + rows_per_write, height)
+            writer.write_rows(im.crop((0, upper, width, lower)).tobytes())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import os
+import struct
+import time
+from collections import namedtuple
+from concurrent import futures
+from PIL import Image
+
+
+__all__ = [
+    'ImageInfo',
+    'probe',
+    'probe_all'
+]
+
+logger = logging.getLogger(__name__)
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_JPEG_SIGNATURE = b'\xff\xd8'
+_BMP_SIGNATURE = b'BM'
+
+# PNG color types with an alpha channel, i.e. gray with alpha and RGBA.
+_PNG_ALPHA_COLOR_TYPES = (4, 6)
+_PNG_PALETTE_COLOR_TYPE = 3
+
+# JPEG start of frame markers, which hold the image size.
+_JPEG_SOF_MARKERS = frozenset(range(0xc0, 0xd0)) - {0xc4, 0xc8, 0xcc}
+
+
+class ImageInfo(namedtuple('ImageInfo', ('width', 'height', 'has_alpha'))):
+    '''This class represents the header information of an image.'''
+    __slots__ = ()
+
+
+def has_alpha(im):
+    '''Whether an opened image has an alpha channel or a transparent color in a palette.'''
+    return im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+
+
+def _probe_png(fp):
+    header = fp.read(33)
+    if len(header) < 33 or header[12:16] != b'IHDR':
+        return None
+    width, height, _, color_type = struct.unpack('>IIBB', header[16:26])
+    if color_type in _PNG_ALPHA_COLOR_TYPES:
+        return ImageInfo(width, height, True)
+    if color_type != _PNG_PALETTE_COLOR_TYPE:
+        return ImageInfo(width, height, False)
+
+    # A palette is transparent if a tRNS chunk comes before the image data. Only the chunk headers are read.
+    while True:
+        chunk = fp.read(8)
+        if len(chunk) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', chunk)
+        if chunk_type == b'tRNS':
+            return ImageInfo(width, height, True)
+        if chunk_type in (b'IDAT', b'IEND'):
+            return ImageInfo(width, height, False)
+        fp.seek(length + 4, os.SEEK_CUR)
+
+
+def _probe_bmp(fp):
+    header = fp.read(34)
+    if len(header) < 26:
+        return None
+    header_size, = struct.unpack('<I', header[14:18])
+    if header_size == 12:
+        width, height = struct.unpack('<HH', header[18:22])
+        return ImageInfo(width, height, False)
+    if len(header) < 34:
+        return None
+    width, height, _, bits, compression = struct.unpack('<iiHHI', header[18:34])
+    # Bit fields may describe an alpha channel, so they are left to Pillow.
+    if compression != 0 or bits not in (1, 4, 8, 24, 32):
+        return None
+    return ImageInfo(width, abs(height), False)
+
+
+def _probe_jpeg(fp):
+    fp.seek(2)
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        # Skip fill bytes.
+        while marker[1] == 0xff:
+            marker = marker[1:] + fp.read(1)
+            if len(marker) < 2:
+                return None
+        if 0xd0 <= marker[1] <= 0xd9 or marker[1] == 0x01:
+            # Markers without a segment.
+            continue
+        segment = fp.read(2)
+        if len(segment) < 2:
+            return None
+        length, = struct.unpack('>H', segment)
+        if marker[1] in _JPEG_SOF_MARKERS:
+            frame = fp.read(5)
+            if len(frame) < 5:
+                return None
+            _, height, width = struct.unpack('>BHH', frame)
+            # JPEG has no alpha channel.
+            return ImageInfo(width, height, False)
+        fp.seek(length - 2, os.SEEK_CUR)
+
+
+def probe(filepath):
+    '''Read the size and the alpha flag of an image.
+
+    Only the header bytes are read for PNG, BMP and JPEG. Other formats are opened with Pillow.
+
+    Returns:
+        :class:`ImageInfo`
+    '''
+    info = None
+    with open(filepath, 'rb') as fp:
+        signature = fp.read(8)
+        fp.seek(0)
+        try:
+            if signature == _PNG_SIGNATURE:
+                info = _probe_png(fp)
+            elif signature.startswith(_JPEG_SIGNATURE):
+                info = _probe_jpeg(fp)
+            elif signature.startswith(_BMP_SIGNATURE):
+                info = _probe_bmp(fp)
+        except struct.error:
+            info = None
+
+        if info is None:
+            fp.seek(0)
+            with Image.open(fp=fp) as im:
+                info = ImageInfo(im.width, im.height, has_alpha(im))
+
+    return info
+
+
+def _stat(filepath):
+    stat = os.stat(filepath)
+    return stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size
+
+
+def _probe_with_cache(filepaths, map_, cache):
+    '''Probe only the images that are not found in a metadata cache, or have changed since.'''
+    paths = [os.path.abspath(filepath) for filepath in filepaths]
+    # The files are stated before they are probed, so a file changed in between is probed again next time.
+    stats = list(map_(_stat, filepaths))
+    entries = cache.get_many(paths)
+
+    infos = [None] * len(filepaths)
+    missing = list()
+    for i, (path, stat) in enumerate(zip(paths, stats)):
+        entry = entries.get(path)
+        if entry is not None and tuple(entry[0:3]) == stat:
+            infos[i] = ImageInfo(*entry[3:6])
+        else:
+            missing.append(i)
+
+    for i, info in zip(missing, map_(probe, [filepaths[i] for i in missing])):
+        infos[i] = info
+    cache.put_many([(paths[i], ) + stats[i] + tuple(infos[i]) for i in missing])
+    logger.debug('Found {} of {} files in the metadata cache.'.format(len(filepaths) - len(missing), len(filepaths)))
+
+    return infos
+
+
+def probe_all(filepaths, max_workers=None, cache=None):
+    '''Probe images on a pool of threads.
+
+    Args:
+        filepaths (list(str)):
+        max_workers (int): The number of threads. The default is bounded, as the work is bound by I/O.
+        cache (:class:`image_packer.cache.MetadataCache`): If given, unchanged files are not opened.
+
+    Returns:
+        list(:class:`ImageInfo`) in the order of `filepaths`.
+    '''
+    filepaths = list(filepaths)
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+    start = time.perf_counter()
+    if len(filepaths) <= 1:
+        map_ = map
+        executor = None
+    else:
+        executor = futures.ThreadPoolExecutor(max_workers=min(max_workers, len(filepaths)))
+        map_ = executor.map
+    try:
+        if cache is None:
+            infos = list(map_(probe, filepaths))
+        else:
+            infos = _probe_with_cache(filepaths, map_, cache)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+
+    if filepaths:
+        logger.info(
+            'Probed {} files in {:.3f}s ({:.1f} files/s).'.format(
+                len(filepaths), elapsed, len(filepaths) / max(elapsed, 1e-9))
+        )
+
+    return infos
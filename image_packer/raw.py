@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import mmap
+import struct
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ['HEADER_SIZE', 'RawWriter', 'RawImage']
+
+# The file starts with the magic, the width, the height, the channel layout, the row pitch and the offset of the rows.
+_MAGIC = b'IMPKRAW\x00'
+_HEADER = struct.Struct('<8sII4sII')
+
+# The rows start at this offset, aligned for direct upload.
+HEADER_SIZE = 32
+
+_CHANNEL_LAYOUTS = {
+    'RGB': b'RGB\x00',
+    'RGBA': b'RGBA',
+}
+
+
+class RawWriter(object):
+    '''This class writes an uncompressed image row by row.
+
+    The file consists of a header of `HEADER_SIZE` bytes followed by the rows, in the order they are written,
+    each padded to the row pitch. The rows are not flipped here: with `enable_vertical_flip` of the packer,
+    the bottom row of the atlas comes first as expected by OpenGL.
+
+    Args:
+        fp: A binary file object.
+        width (int):
+        height (int):
+        mode (str): 'RGB' or 'RGBA'.
+        row_alignment (int): The row pitch is a multiple of this, e.g. 4 for GL_UNPACK_ALIGNMENT.
+    '''
+    def __init__(self, fp, width, height, mode, row_alignment=4):
+        if mode not in _CHANNEL_LAYOUTS:
+            raise ValueError('Unsupported mode: {}'.format(mode))
+        if row_alignment <= 0:
+            raise ValueError('The row alignment must be positive.')
+
+        self._fp = fp
+        self._height = height
+        self._row_bytes = width * len(mode)
+        self._row_pitch = -(-self._row_bytes // row_alignment) * row_alignment
+        self._padding = bytes(self._row_pitch - self._row_bytes)
+        self._num_rows = 0
+
+        header = _HEADER.pack(_MAGIC, width, height, _CHANNEL_LAYOUTS[mode], self._row_pitch, HEADER_SIZE)
+        fp.write(header + bytes(HEADER_SIZE - len(header)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    @property
+    def num_rows(self):
+        '''The number of rows written.'''
+        return self._num_rows
+
+    @property
+    def row_pitch(self):
+        '''The bytes of a row including the padding.'''
+        return self._row_pitch
+
+    def write_rows(self, data):
+        '''Write rows of packed pixels, e.g. from :meth:`PIL.Image.Image.tobytes`.'''
+        num_rows, remainder = divmod(len(data), self._row_bytes) if self._row_bytes > 0 else (0, 0)
+        if remainder != 0:
+            raise ValueError('The data is not a multiple of rows.')
+        if self._num_rows + num_rows > self._height:
+            raise ValueError('Too many rows.')
+
+        if not self._padding:
+            self._fp.write(data)
+        else:
+            view = memoryview(data)
+            for i in range(num_rows):
+                self._fp.write(view[i * self._row_bytes:(i + 1) * self._row_bytes])
+                self._fp.write(self._padding)
+        self._num_rows += num_rows
+
+    def close(self):
+        '''Finish the image. All rows must have been written.'''
+        if self._num_rows != self._height:
+            raise ValueError('{} of {} rows have been written.'.format(self._num_rows, self._height))
+
+
+class RawImage(object):
+    '''This class maps an image written by :class:`RawWriter` into memory without copying it.
+
+    The views returned must be released before closing the image.
+
+    Args:
+        filepath (str): A file path.
+    '''
+    def __init__(self, filepath):
+        with open(filepath, 'rb') as fp:
+            header = fp.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ValueError('{} is not a raw image.'.format(filepath))
+            magic, width, height, layout, row_pitch, offset = _HEADER.unpack(header)
+            if magic != _MAGIC:
+                raise ValueError('{} is not a raw image.'.format(filepath))
+            mode = {value: key for key, value in _CHANNEL_LAYOUTS.items()}.get(layout)
+            if mode is None:
+                raise ValueError('Unsupported channel layout: {}'.format(layout))
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < offset + row_pitch * height:
+            self._mmap.close()
+            raise ValueError('{} is truncated.'.format(filepath))
+
+        self._width = width
+        self._height = height
+        self._mode = mode
+        self._row_pitch = row_pitch
+        self._offset = offset
+        self._buffer = memoryview(self._mmap)
+        self._data = self._buffer[offset:offset + row_pitch * height]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def size(self):
+        return self._width, self._height
+
+    @property
+    def mode(self):
+        '''The channel layout, 'RGB' or 'RGBA'.'''
+        return self._mode
+
+    @property
+    def row_pitch(self):
+        '''The bytes of a row including the padding.'''
+        return self._row_pitch
+
+    @property
+    def data(self):
+        '''A read-only memoryview of the rows including the padding.'''
+        return self._data
+
+    def to_numpy(self):
+        '''Return a read-only NumPy view of shape (height, width, channels) without the padding.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        '''
+        if numpy is None:
+            raise ImportError('NumPy is required.')
+        channels = len(self._mode)
+        return numpy.ndarray(
+            shape=(self._height, self._width, channels),
+            dtype=numpy.uint8,
+            buffer=self._mmap,
+            offset=self._offset,
+            strides=(self._row_pitch, channels, 1)
+        )
+
+    def to_image(self):
+        '''Return a copy as :class:`PIL.Image.Image`.'''
+        return Image.frombytes(self._mode, self.size, self._data, 'raw', self._mode, self._row_pitch)
+
+    def close(self):
+        if self._mmap.closed:
+            return
+        self._data.release()
+        self._buffer.release()
+        self._mmap.close()
+
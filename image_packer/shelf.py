@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from . import blf
+
+
+__all__ = ['shelf']
+
+
+def shelf(pieces, container_width, options=None):
+    '''Run all iterations with the next-fit shelf algorithm.
+
+    Pieces are placed from left to right on the topmost shelf, and a new shelf is opened above it
+    when a piece does not fit. It runs in linear time, so the sort in front of it dominates,
+    but the filling rate is usually lower than the other engines.
+    It works best on pieces sorted in descending order of height.
+
+    Args:
+        pieces (list(:class:`image_packer.blf.Piece`)):
+        container_width (int):
+        options (dict):
+
+    Returns:
+        container_width, list(:class:`image_packer.blf.Region`)
+    '''
+    container_width, correction_info = blf.resolve_options(pieces, container_width, options)
+    margin = correction_info.margin
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+
+    # Pieces are grown by the spacing between them, so the shelves work in a coordinate system without margins.
+    bin_width = container_width - margin.left - margin.right + offset_x
+
+    is_cancelled = (options or {}).get('is_cancelled')
+
+    regions = list()
+    x, y, shelf_height = 0, 0, 0
+    for i, piece in enumerate(pieces):
+        blf.check_cancelled(is_cancelled, i)
+        width = piece.size.width + offset_x
+        height = piece.size.height + offset_y
+        if width > bin_width:
+            raise blf.LocationNotFoundError
+
+        if x + width > bin_width:
+            y += shelf_height
+            x, shelf_height = 0, 0
+
+        regions.append(
+            blf.Region.from_position_and_size(
+                uid=piece.uid,
+                x=x + margin.left,
+                y=y + margin.bottom,
+                width=piece.size.width,
+                height=piece.size.height
+            )
+        )
+        x += width
+        # The topmost shelf can always grow.
+        if height > shelf_height:
+            shelf_height = height
+
+    return container_width, regions
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from . import blf
+
+
+__all__ = ['skyline']
+
+
+class _Skyline(object):
+    '''This class represents a bottom-left skyline with a waste map.
+
+    Pieces are grown by the spacing between them, so the skyline works in a coordinate system without margins.
+    The waste map keeps the free rectangles left below the skyline and fills them first.
+    '''
+    def __init__(self, width):
+        self._width = width
+        # Each node is [x, y, width] and the nodes cover [0, width) from left to right.
+        self._nodes = [[0, 0, width]]
+        self._waste = list()
+
+    def _fit(self, index, width):
+        '''Return the lowest y at which a rectangle can rest on the nodes from `index`, or None.'''
+        nodes = self._nodes
+        x = nodes[index][0]
+        if x + width > self._width:
+            return None
+
+        y = 0
+        width_left = width
+        i = index
+        while width_left > 0:
+            node = nodes[i]
+            if node[1] > y:
+                y = node[1]
+            width_left -= node[2]
+            i += 1
+        return y
+
+    def _find_in_waste(self, width, height):
+        '''Find the best area fit in the waste map.'''
+        best_index, best_area = None, None
+        for i, (x, y, w, h) in enumerate(self._waste):
+            if width <= w and height <= h:
+                area = w * h
+                if best_area is None or area < best_area:
+                    best_index, best_area = i, area
+        return best_index
+
+    def _split_waste(self, index, width, height):
+        '''Place a rectangle at the bottom-left of a waste rectangle and split the rest along the shorter axis.'''
+        x, y, w, h = self._waste.pop(index)
+        right_w, top_h = w - width, h - height
+        if right_w * height <= width * top_h:
+            # Split horizontally.
+            self._waste.append((x + width, y, right_w, height))
+            self._waste.append((x, y + height, w, top_h))
+        else:
+            # Split vertically.
+            self._waste.append((x + width, y, right_w, h))
+            self._waste.append((x, y + height, width, top_h))
+        return x, y
+
+    def _add_waste(self, index, x, y, width):
+        '''Add the areas between the skyline and a rectangle placed at (x, y) to the waste map.'''
+        nodes = self._nodes
+        right = x + width
+        i = index
+        while i < len(nodes) and nodes[i][0] < right:
+            node_x, node_y, node_w = nodes[i]
+            if node_y < y:
+                left = max(x, node_x)
+                self._waste.append((left, node_y, min(right, node_x + node_w) - left, y - node_y))
+            i += 1
+
+    def _add_level(self, index, x, y, width, height):
+        '''Raise the skyline over a rectangle placed at (x, y).'''
+        nodes = self._nodes
+        nodes.insert(index, [x, y + height, width])
+
+        right = x + width
+        i = index + 1
+        while i < len(nodes):
+            node = nodes[i]
+            if node[0] >= right:
+                break
+            shrink = right - node[0]
+            if node[2] <= shrink:
+                del nodes[i]
+                continue
+            node[0] += shrink
+            node[2] -= shrink
+            break
+
+        # Merge the neighbours with the same height.
+        i = max(0, index - 1)
+        while i < min(len(nodes) - 1, index + 1):
+            if nodes[i][1] == nodes[i + 1][1]:
+                nodes[i][2] += nodes[i + 1][2]
+                del nodes[i + 1]
+            else:
+                i += 1
+
+    def prune_waste(self, min_width, min_height):
+        '''Drop the waste rectangles that are too small for any remaining piece.'''
+        self._waste = [rect for rect in self._waste if rect[2] >= min_width and rect[3] >= min_height]
+
+    def insert(self, width, height):
+        '''Place a rectangle and return its position.'''
+        if self._waste:
+            index = self._find_in_waste(width, height)
+            if index is not None:
+                return self._split_waste(index, width, height)
+
+        best_index, best_y, best_top, best_width = None, None, None, None
+        for i, node in enumerate(self._nodes):
+            y = self._fit(i, width)
+            if y is None:
+                # The following nodes are even further to the right.
+                break
+            top = y + height
+            if best_top is None or top < best_top or (top == best_top and node[2] < best_width):
+                best_index, best_y, best_top, best_width = i, y, top, node[2]
+
+        if best_index is None:
+            raise blf.LocationNotFoundError
+
+        x = self._nodes[best_index][0]
+        self._add_waste(best_index, x, best_y, width)
+        self._add_level(best_index, x, best_y, width, height)
+        return x, best_y
+
+
+def skyline(pieces, container_width, options=None):
+    '''Run all iterations with the bottom-left skyline algorithm.
+
+    Args:
+        pieces (list(:class:`image_packer.blf.Piece`)):
+        container_width (int):
+        options (dict):
+
+    Returns:
+        container_width, list(:class:`image_packer.blf.Region`)
+    '''
+    container_width, correction_info = blf.resolve_options(pieces, container_width, options)
+    margin = correction_info.margin
+    offset_x = correction_info.offset_x
+    offset_y = correction_info.offset_y
+
+    size_bounds = blf.remaining_size_bounds(pieces)
+    packer = _Skyline(width=container_width - margin.left - margin.right + offset_x)
+
+    is_cancelled = (options or {}).get('is_cancelled')
+
+    regions = list()
+    last_bounds = None
+    for i, piece in enumerate(pieces):
+        blf.check_cancelled(is_cancelled, i)
+        if size_bounds[i][0:2] != last_bounds:
+            last_bounds = size_bounds[i][0:2]
+            packer.prune_waste(min_width=last_bounds[0] + offset_x, min_height=last_bounds[1] + offset_y)
+
+        x, y = packer.insert(width=piece.size.width + offset_x, height=piece.size.height + offset_y)
+        regions.append(
+            blf.Region.from_position_and_size(
+                uid=piece.uid,
+                x=x + margin.left,
+                y=y + margin.bottom,
+                width=piece.size.width,
+                height=piece.size.height
+            )
+        )
+
+    return container_width, regions
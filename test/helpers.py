@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+from unittest import TestCase
+
+import sys
+sys.path.append('../')
+from image_packer import blf
+
+
+class LayoutTestCase(TestCase):
+    '''The base class of the tests of the packing engines.'''
+
+    @staticmethod
+    def make_random_pieces(width, height, num_pieces):
+        pieces = list()
+        for uid in range(num_pieces):
+            w = random.randint(*width)
+            h = random.randint(*height)
+            pieces.append(blf.Piece(uid=uid, size=blf.Size(w, h)))
+
+        return pieces
+
+    def assert_valid_layout(self, pieces, container_width, regions, correction_info):
+        margin = correction_info.margin
+        self.assertEqual(sorted(region.uid for region in regions), [piece.uid for piece in pieces])
+        for i, region in enumerate(regions):
+            self.assertEqual((region.width, region.height), pieces[region.uid].size)
+            self.assertTrue(region.left >= margin.left)
+            self.assertTrue(region.bottom >= margin.bottom)
+            self.assertTrue(region.right + margin.right <= container_width)
+            for other in regions[i + 1:]:
+                self.assertTrue(
+                    region.right + correction_info.offset_x <= other.left
+                    or other.right + correction_info.offset_x <= region.left
+                    or region.top + correction_info.offset_y <= other.bottom
+                    or other.top + correction_info.offset_y <= region.bottom
+                )
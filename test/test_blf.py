@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pickle
+import random
+
+import sys
+sys.path.append('../')
+from image_packer import blf
+from helpers import LayoutTestCase
+
+
+class TestBlf(LayoutTestCase):
+
+    @staticmethod
+    def to_tuples(regions):
+        return [(region.uid, region.top, region.right, region.bottom, region.left) for region in regions]
+
+    def test_geometry(self):
+        size = blf.Size(3, 4)
+        self.assertEqual((size.width, size.height, size.area), (3, 4, 12))
+
+        region = blf.Region.from_position_and_size(uid=0, x=1, y=2, width=3, height=4)
+        self.assertEqual((region.top, region.right, region.bottom, region.left), (6, 4, 2, 1))
+        self.assertEqual((region.width, region.height, region.area), (3, 4, 12))
+
+        point = blf.StablePoint(x=1, y=2)
+        self.assertEqual((point.x, point.y, point.gap_width, point.gap_height), (1, 2, 0, 0))
+
+        correction_info = blf.CorrectionInfo(margin=blf.Thickness(1, 2, 3, 4), collapse_margin=True)
+        self.assertEqual((correction_info.horizontal_overlap, correction_info.vertical_overlap), (2, 1))
+
+        # Compact representations without a per-instance dictionary.
+        for obj in (size, blf.Thickness(0, 0, 0, 0), blf.Piece(0, size), point, region, correction_info):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+        piece = blf.Piece(uid=0, size=size)
+        self.assertEqual(pickle.loads(pickle.dumps(piece)), piece)
+        self.assertEqual(pickle.loads(pickle.dumps(region)), region)
+
+    def test_region_index(self):
+        region_index = blf.RegionIndex(cell_size=8)
+        regions = list()
+        for _ in range(200):
+            region = blf.Region.from_position_and_size(
+                uid=len(regions),
+                x=random.randint(0, 100),
+                y=random.randint(0, 100),
+                width=random.randint(1, 20),
+                height=random.randint(1, 20)
+            )
+            regions.append(region)
+            region_index.add(region)
+
+        self.assertEqual(len(region_index), len(regions))
+
+        for _ in range(200):
+            left, bottom = random.randint(-10, 110), random.randint(-10, 110)
+            right, top = left + random.randint(1, 30), bottom + random.randint(1, 30)
+            expected = {
+                region.uid for region in regions
+                if region.left < right and region.right > left and region.bottom < top and region.top > bottom
+            }
+            candidates = {region.uid for region in region_index.query(left, bottom, right, top)}
+            self.assertTrue(expected <= candidates)
+
+    def test_find_point_index(self):
+        correction_info = blf.CorrectionInfo(margin=blf.Thickness(1, 1, 1, 1))
+        pieces = self.make_random_pieces(width=(1, 32), height=(1, 32), num_pieces=50)
+        _, regions = blf.blf(pieces, 128, {'margin': correction_info.margin})
+
+        region_index = blf.RegionIndex(cell_size=16)
+        for region in regions:
+            region_index.add(region)
+
+        stable_points = blf.StablePointQueue(
+            blf.StablePoint(x=random.randint(0, 128), y=random.randint(0, 256))
+            for _ in range(100)
+        )
+        stable_points.push(blf.StablePoint(x=1, y=1000))
+        size = blf.Size(4, 4)
+        self.assertEqual(
+            blf.find_point_index(stable_points, size, regions, 128, correction_info),
+            blf.find_point_index(stable_points, size, regions, 128, correction_info, region_index=region_index)
+        )
+
+    def test_stable_point_queue(self):
+        points = [blf.StablePoint(x=random.randint(0, 8), y=random.randint(0, 8)) for _ in range(100)]
+        queue = blf.StablePointQueue(points)
+        self.assertEqual(len(queue), len(points))
+        # Ordered by (y, x) and stable for equal positions.
+        self.assertEqual(list(queue), sorted(points, key=lambda point: (point.y, point.x)))
+
+        index = random.randrange(len(queue))
+        point = queue[index]
+        self.assertIs(queue.pop(index), point)
+        self.assertEqual(len(queue), len(points) - 1)
+
+    def test_stable_point_queue_pruning(self):
+        queue = blf.StablePointQueue(blf.StablePoint(x=x, y=y) for y in range(10) for x in range(10))
+
+        # Points dominated by a queued point at the same position are rejected.
+        self.assertFalse(queue.offer(blf.StablePoint(x=1, y=1, gap_width=5), lambda point: False))
+        self.assertTrue(queue.offer(blf.StablePoint(x=1, y=10), lambda point: False))
+        self.assertFalse(queue.offer(blf.StablePoint(x=1, y=11), lambda point: True))
+        self.assertEqual(queue.num_pruned, 2)
+
+        num_removed = queue.prune(lambda point: point.x < 5, min_y=2, max_y=3)
+        self.assertEqual(num_removed, 10)
+        self.assertEqual(queue.num_pruned, 12)
+        self.assertEqual(len(queue), 91)
+        self.assertFalse(any(2 <= point.y <= 3 and point.x < 5 for point in queue))
+
+        num_removed = queue.prune(lambda point: point.y == 10)
+        self.assertEqual(num_removed, 1)
+        self.assertEqual(len(queue), 90)
+
+        # A real run reports the points it pruned.
+        stats = dict()
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=100)
+        blf.blf(pieces, 200, {'stats': stats})
+        self.assertTrue(stats['num_pruned'] > 0)
+
+    def test_layout(self):
+        margin = blf.Thickness(1, 2, 0, 1)
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=100)
+        for collapse_margin in (False, True):
+            options = {'margin': margin, 'collapse_margin': collapse_margin}
+            width, regions = blf.blf(pieces, 200, options)
+            self.assertEqual(len(regions), len(pieces))
+            for i, region in enumerate(regions):
+                self.assertTrue(region.left >= margin.left)
+                self.assertTrue(region.bottom >= margin.bottom)
+                self.assertTrue(region.right + margin.right <= width)
+                for other in regions[i + 1:]:
+                    self.assertFalse(
+                        region.left < other.right and region.right > other.left
+                        and region.bottom < other.top and region.top > other.bottom
+                    )
+
+    def test_fill(self):
+        margin = blf.Thickness(1, 1, 1, 1)
+        options = {'margin': margin}
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        width, regions = blf.blf(pieces, 200, options)
+        height = max(region.top for region in regions) + margin.top
+        # Remove every other region and fill the space with small pieces.
+        kept = regions[::2]
+        small_pieces = [blf.Piece(uid=100 + i, size=blf.Size(4, 4)) for i in range(5)]
+        new_regions = blf.fill(small_pieces, kept, blf.Size(width, height), options)
+        self.assertEqual(len(new_regions), len(small_pieces))
+        all_regions = kept + new_regions
+        for i, region in enumerate(all_regions):
+            self.assertTrue(region.left >= margin.left)
+            self.assertTrue(region.bottom >= margin.bottom)
+            self.assertTrue(region.right + margin.right <= width)
+            self.assertTrue(region.top + margin.top <= height)
+            for other in all_regions[i + 1:]:
+                self.assertFalse(
+                    region.left - 2 < other.right and region.right + 2 > other.left
+                    and region.bottom - 2 < other.top and region.top + 2 > other.bottom
+                )
+        #
+        with self.assertRaises(blf.LocationNotFoundError):
+            blf.fill([blf.Piece(uid=200, size=blf.Size(width, 1))], kept, blf.Size(width, height), options)
+
+    def test_rotation(self):
+        margin = blf.Thickness(1, 1, 1, 1)
+        options = {'margin': margin, 'enable_rotation': True}
+        pieces = self.make_random_pieces(width=(1, 8), height=(16, 64), num_pieces=50)
+        # This piece fits only rotated.
+        pieces.append(blf.Piece(uid=50, size=blf.Size(200, 2)))
+        width, regions = blf.blf(pieces, 100, options)
+        uid_to_size = {piece.uid: piece.size for piece in pieces}
+        self.assertTrue(any(region.rotated for region in regions))
+        for i, region in enumerate(regions):
+            size = uid_to_size[region.uid]
+            if region.rotated:
+                self.assertEqual((region.width, region.height), (size.height, size.width))
+            else:
+                self.assertEqual((region.width, region.height), size)
+            self.assertTrue(region.right + margin.right <= width)
+            for other in regions[i + 1:]:
+                self.assertFalse(
+                    region.left - 2 < other.right and region.right + 2 > other.left
+                    and region.bottom - 2 < other.top and region.top + 2 > other.bottom
+                )
+
+        # A piece wider than the container fits only when rotated.
+        options = {'enable_auto_size': False, 'enable_rotation': True}
+        width, regions = blf.blf([blf.Piece(uid=0, size=blf.Size(30, 5))], 10, options)
+        self.assertEqual(width, 10)
+        self.assertEqual(regions, [blf.Region(uid=0, top=30, right=5, bottom=0, left=0, rotated=True)])
+        # The same for the free space of a layout.
+        new_regions = blf.fill([blf.Piece(uid=1, size=blf.Size(20, 5))], regions, blf.Size(10, 30), options)
+        self.assertEqual(new_regions, [blf.Region(uid=1, top=20, right=10, bottom=0, left=5, rotated=True)])
+        with self.assertRaises(blf.LocationNotFoundError):
+            blf.fill([blf.Piece(uid=1, size=blf.Size(40, 5))], regions, blf.Size(10, 30), options)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from unittest import skipIf
+
+import sys
+sys.path.append('../')
+from image_packer import blf
+from image_packer import blf_numpy
+from helpers import LayoutTestCase
+
+
+@skipIf(not blf_numpy.is_available(), 'numpy not found.')
+class TestBlfNumpy(LayoutTestCase):
+
+    @staticmethod
+    def to_tuples(regions):
+        return [(region.uid, region.top, region.right, region.bottom, region.left) for region in regions]
+
+    def test_same_as_blf(self):
+        keys = ('collapse_margin', 'enable_auto_size', 'force_pow2')
+        patterns = (
+            (True, True, True),
+            (True, False, False),
+            (False, True, False),
+            (False, False, True),
+        )
+
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=200)
+        pieces.sort(key=lambda piece: -piece.size.height)
+        for margin in (blf.Thickness(0, 0, 0, 0), blf.Thickness(1, 2, 3, 4)):
+            for pattern in patterns:
+                options = {k: v for k, v in zip(keys, pattern)}
+                options['margin'] = margin
+                expected_width, expected_regions = blf.blf(pieces, 256, options)
+                width, regions = blf_numpy.blf(pieces, 256, options)
+                self.assertEqual(width, expected_width)
+                self.assertEqual(self.to_tuples(regions), self.to_tuples(expected_regions))
+                self.assertTrue(all(isinstance(region.left, int) for region in regions))
+
+    def test_location_not_found(self):
+        pieces = [blf.Piece(uid=uid, size=blf.Size(64, 64)) for uid in range(10)]
+        options = {'enable_auto_size': False}
+        with self.assertRaises(blf.LocationNotFoundError):
+            blf_numpy.blf(pieces, 63, options)
@@ -3,13 +3,16 @@
 import logging
 import math
 import random
+import time
 import uuid
+from concurrent import futures
 from unittest import TestCase
 
 import sys
 sys.path.append('../')
 from image_packer import blf
 from image_packer import blf_solver
+from image_packer import cache
 
 
 class TestBlfSolver(TestCase):
@@ -241,6 +244,122 @@ class TestBlfSolver(TestCase):
                 self.assertTrue(self.is_power_of_2(result[1]))
             self.assertEqual(len(pieces), len(result[2]))
 
+    def test_engine(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=10)
+        for engine in blf_solver.ENGINES:
+            options = {
+                'margin': blf.Thickness(top=1, right=1, bottom=1, left=1),
+                'engine': engine
+            }
+            result = blf_solver.solve(pieces=pieces, container_width=66, options=options)
+            self.assertTrue(isinstance(result[0], int))
+            self.assertTrue(isinstance(result[1], int))
+            self.assertEqual(len(pieces), len(result[2]))
+        #
+        with self.assertRaises(ValueError):
+            blf_solver.solve(pieces=pieces, container_width=66, options={'engine': 'unknown'})
+
+    def test_engine_candidates(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=10)
+        margin = blf.Thickness(top=1, right=1, bottom=1, left=1)
+        engines = ('blf', 'skyline', 'maxrects_bssf', 'maxrects_bl')
+
+        def filling_rate(result):
+            return blf_solver.calc_filling_rate(blf.Size(result[0], result[1]), result[2])
+
+        best = blf_solver.solve(pieces=pieces, container_width=66, options={'margin': margin, 'engine': engines})
+        self.assertEqual(len(pieces), len(best[2]))
+        for engine in engines:
+            result = blf_solver.solve(pieces=pieces, container_width=66, options={'margin': margin, 'engine': engine})
+            self.assertTrue(filling_rate(best) >= filling_rate(result))
+
+    def test_run_packed_solver(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        options = {
+            'margin': blf.Thickness(top=1, right=1, bottom=1, left=1),
+            'collapse_margin': False,
+            'enable_auto_size': True,
+            'force_pow2': False,
+            'engine': 'blf'
+        }
+        filling_rate, container_size, placements = blf_solver.run_packed_solver(
+            sizes=blf_solver.pack_sizes(pieces),
+            container_width=100,
+            options=options,
+            key=blf_solver.by_area
+        )
+        regions = blf_solver.unpack_regions(pieces, placements)
+        #
+        expected = blf_solver.run_solver(pieces=pieces, container_width=100, options=options, key=blf_solver.by_area)
+        self.assertAlmostEqual(filling_rate, expected[0])
+        self.assertEqual(container_size, tuple(expected[1]))
+        self.assertEqual(regions, expected[2])
+
+    def test_orderings(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        margin = blf.Thickness(top=1, right=1, bottom=1, left=1)
+
+        def filling_rate(result):
+            return sum(region.area for region in result[2]) / (result[0] * result[1])
+
+        best = blf_solver.solve(
+            pieces=pieces, container_width=100, options={'margin': margin, 'orderings': tuple(blf_solver.ORDERINGS)})
+        for ordering in blf_solver.ORDERINGS:
+            result = blf_solver.solve(
+                pieces=pieces, container_width=100, options={'margin': margin, 'orderings': (ordering, )})
+            self.assertTrue(filling_rate(best) >= filling_rate(result))
+        # A sort key function.
+        result = blf_solver.solve(
+            pieces=pieces, container_width=100, options={'margin': margin, 'orderings': (lambda piece: piece.uid, )})
+        self.assertEqual(len(result[2]), len(pieces))
+        #
+        with self.assertRaises(ValueError):
+            blf_solver.solve(pieces=pieces, container_width=100, options={'orderings': ('unknown', )})
+
+    def test_target_filling_rate(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        options = {
+            'margin': blf.Thickness(top=1, right=1, bottom=1, left=1),
+            'collapse_margin': False,
+            'enable_auto_size': True,
+            'force_pow2': False,
+            'engine': 'blf'
+        }
+        # Any result reaches the target, so only the first ordering is evaluated.
+        result = blf_solver.solve(
+            pieces=pieces, container_width=100, options=dict(options, target_filling_rate=0.0))
+        expected = blf_solver.run_solver(
+            pieces=cache.canonical_order(pieces), container_width=100, options=options, key=blf_solver.by_height)
+        self.assertEqual(result, (expected[1].width, expected[1].height, expected[2]))
+
+    def test_candidate_widths(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        margin = blf.Thickness(top=1, right=1, bottom=1, left=1)
+        correction_info = blf.CorrectionInfo(margin=margin, collapse_margin=False)
+        max_width = sum(piece.size.width + 2 for piece in pieces)
+        #
+        widths = blf_solver.calc_candidate_widths(pieces, margin, correction_info, force_pow2=False)
+        self.assertEqual(widths, sorted(set(widths)))
+        self.assertTrue(widths[0] >= max(piece.size.width for piece in pieces) + 2)
+        self.assertEqual(widths[-1], max_width)
+        #
+        widths = blf_solver.calc_candidate_widths(pieces, margin, correction_info, force_pow2=True)
+        self.assertTrue(all(blf.next_power_of_2(width) == width for width in widths))
+        self.assertTrue(widths[-1] >= max_width)
+
+    def test_auto_width(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        margin = blf.Thickness(top=1, right=1, bottom=1, left=1)
+        correction_info = blf.CorrectionInfo(margin=margin, collapse_margin=False)
+        for force_pow2 in (False, True):
+            with self.subTest(force_pow2=force_pow2):
+                options = {'margin': margin, 'force_pow2': force_pow2}
+                width, height, regions = blf_solver.solve(pieces=pieces, container_width='auto', options=options)
+                self.assertEqual(len(regions), len(pieces))
+                for candidate in blf_solver.calc_candidate_widths(pieces, margin, correction_info, force_pow2):
+                    result = blf_solver.solve(pieces=pieces, container_width=candidate, options=options)
+                    self.assertTrue(width * height <= result[0] * result[1])
+
     def test_concurrent_processing(self):
         pieces = self.make_random_pieces(width=64, height=64, num_pieces=100)
         options = {
@@ -256,3 +375,168 @@ class TestBlfSolver(TestCase):
         #
         with self.assertRaises(blf.LocationNotFoundError):
             blf_solver.solve(pieces=pieces, container_width=64, options=options)
+
+    def test_executor(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=100)
+        options = {'margin': blf.Thickness(top=1, right=1, bottom=1, left=1)}
+        # The shared pool is reused until it is shut down.
+        executor = blf_solver.get_executor()
+        self.assertIs(blf_solver.get_executor(), executor)
+        expected = blf_solver.solve(pieces=pieces, container_width=100, options=options)
+        self.assertEqual(blf_solver.solve(pieces=pieces, container_width=100, options=options), expected)
+        blf_solver.shutdown_executor()
+        self.assertIsNot(blf_solver.get_executor(), executor)
+        blf_solver.shutdown_executor()
+        # An injected executor.
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            result = blf_solver.solve(pieces=pieces, container_width=100, options=options, executor=executor)
+        self.assertEqual(result, expected)
+
+    def test_parallel(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        options = {'margin': blf.Thickness(top=1, right=1, bottom=1, left=1)}
+        expected = blf_solver.solve(pieces=pieces, container_width=100, options=dict(options, parallel=False))
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            result = blf_solver.solve(
+                pieces=pieces, container_width=100, options=dict(options, parallel=True), executor=executor)
+        self.assertEqual(result, expected)
+        self.assertEqual(blf_solver.solve(pieces=pieces, container_width=100, options=options), expected)
+
+    def test_early_stop(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=1000)
+        # The shelf result stops the evaluation while blf is still running.
+        options = {
+            'engine': ('shelf', 'blf'),
+            'orderings': ('height', ),
+            'target_filling_rate': 0.0,
+            'parallel': True
+        }
+        start = time.perf_counter()
+        blf.blf(sorted(pieces, key=blf_solver.by_height), 1000)
+        blf_time = time.perf_counter() - start
+
+        submitted = list()
+
+        class RecordingExecutor(futures.ProcessPoolExecutor):
+            def submit(self, *args, **kwargs):
+                future = super().submit(*args, **kwargs)
+                submitted.append(future)
+                return future
+
+        with RecordingExecutor(max_workers=2) as executor:
+            start = time.perf_counter()
+            blf_solver.solve(pieces=pieces, container_width=1000, options=options, executor=executor)
+            self.assertTrue(time.perf_counter() - start < blf_time)
+            # The running evaluation stops by itself, without being waited for.
+            self.assertIsInstance(submitted[1].exception(), blf.CancelledError)
+
+    def test_calibrate_engine(self):
+        coefficient, exponent, spread_exponent = blf_solver.calibrate_engine('shelf')
+        self.assertTrue(coefficient > 0.0)
+        self.assertTrue(1.0 <= exponent <= 3.0)
+        self.assertTrue(0.0 <= spread_exponent <= 1.0)
+        self.assertEqual(blf_solver.calibrate_engine('shelf'), (coefficient, exponent, spread_exponent))
+
+        # A single worker never wins, so nothing is calibrated.
+        blf_solver._engine_costs.pop('skyline', None)
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=100)
+        self.assertFalse(blf_solver.is_parallel_faster(['skyline'], pieces, num_workers=1))
+        self.assertNotIn('skyline', blf_solver._engine_costs)
+
+    def test_deterministic(self):
+        pieces = self.make_random_pieces(width=(1, 16), height=(1, 16), num_pieces=50)
+        options = {'margin': blf.Thickness(top=1, right=1, bottom=1, left=1)}
+        width, height, regions = blf_solver.solve(pieces=pieces, container_width=100, options=options)
+        # The same sizes in another order and with other ids give the same layout.
+        shuffled = [blf.Piece(uid=uuid.uuid4(), size=piece.size) for piece in pieces]
+        random.shuffle(shuffled)
+        result = blf_solver.solve(pieces=shuffled, container_width=100, options=options)
+        self.assertEqual(result[0:2], (width, height))
+        self.assertEqual(
+            sorted((region.left, region.bottom, region.right, region.top) for region in result[2]),
+            sorted((region.left, region.bottom, region.right, region.top) for region in regions)
+        )
+
+    def test_cache(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=50)
+        options = {'margin': blf.Thickness(top=1, right=1, bottom=1, left=1)}
+        with cache.LayoutCache(':memory:') as layout_cache:
+            expected = blf_solver.solve(pieces=pieces, container_width=100, options=options, cache=layout_cache)
+            self.assertEqual(len(layout_cache), 1)
+            self.assertEqual(
+                blf_solver.solve(pieces=pieces, container_width=100, options=options, cache=layout_cache), expected)
+            self.assertEqual(len(layout_cache), 1)
+            # Cached placements are mapped to the current pieces.
+            renamed = [blf.Piece(uid=uuid.uuid4(), size=piece.size) for piece in pieces]
+            width, height, regions = blf_solver.solve(
+                pieces=renamed, container_width=100, options=options, cache=layout_cache)
+            self.assertEqual(len(layout_cache), 1)
+            uid_to_size = {piece.uid: piece.size for piece in renamed}
+            self.assertEqual(sorted(region.uid for region in regions), sorted(uid_to_size.keys()))
+            for region in regions:
+                self.assertEqual((region.width, region.height), uid_to_size[region.uid])
+            # Other options make another key.
+            blf_solver.solve(pieces=pieces, container_width=128, options=options, cache=layout_cache)
+            self.assertEqual(len(layout_cache), 2)
+
+    def test_solve_pages(self):
+        pieces = self.make_random_pieces(width=(1, 32), height=(1, 32), num_pieces=100)
+        margin = blf.Thickness(top=1, right=1, bottom=1, left=1)
+        for force_pow2, max_height, expected_max_height in ((False, 100, 100), (True, 100, 64)):
+            with self.subTest(force_pow2=force_pow2):
+                options = {'margin': margin, 'force_pow2': force_pow2}
+                pages = blf_solver.solve_pages(
+                    pieces=pieces, container_width=128, max_height=max_height, options=options)
+                self.assertTrue(len(pages) > 1)
+                placed_uids = list()
+                for width, height, regions in pages:
+                    self.assertTrue(height <= expected_max_height)
+                    self.assertTrue(all(region.top + margin.top <= height for region in regions))
+                    self.assertTrue(all(region.right + margin.right <= width for region in regions))
+                    for i, region in enumerate(regions):
+                        for other in regions[i + 1:]:
+                            self.assertFalse(
+                                region.left < other.right and other.left < region.right
+                                and region.bottom < other.top and other.bottom < region.top
+                            )
+                    placed_uids.extend(region.uid for region in regions)
+                self.assertEqual(sorted(placed_uids, key=str), sorted((piece.uid for piece in pieces), key=str))
+
+        # A single page is the same as solve.
+        options = {'margin': margin}
+        expected = blf_solver.solve(pieces=pieces, container_width=128, options=options)
+        pages = blf_solver.solve_pages(pieces=pieces, container_width=128, max_height=10000, options=options)
+        self.assertEqual(pages, [expected])
+
+        with self.assertRaises(ValueError):
+            blf_solver.solve_pages(pieces=pieces, container_width=128, max_height=20, options=options)
+
+    def test_rotation(self):
+        pieces = self.make_random_pieces(width=(1, 8), height=(16, 64), num_pieces=50)
+        # This piece fits only rotated.
+        pieces.append(blf.Piece(uid=uuid.uuid4(), size=blf.Size(200, 2)))
+        options = {'margin': blf.Thickness(top=1, right=1, bottom=1, left=1), 'enable_rotation': True}
+        expected = blf_solver.solve(pieces=pieces, container_width=100, options=dict(options, parallel=False))
+        self.assertTrue(any(region.rotated for region in expected[2]))
+        # The rotation survives the worker processes and the cache.
+        self.assertEqual(
+            blf_solver.solve(pieces=pieces, container_width=100, options=dict(options, parallel=True)), expected)
+        with cache.LayoutCache(':memory:') as layout_cache:
+            blf_solver.solve(pieces=pieces, container_width=100, options=options, cache=layout_cache)
+            self.assertEqual(
+                blf_solver.solve(pieces=pieces, container_width=100, options=options, cache=layout_cache), expected)
+        # Other engines place the pieces as they are.
+        width, height, regions = blf_solver.solve(
+            pieces=pieces, container_width=100, options=dict(options, engine='shelf'))
+        self.assertFalse(any(region.rotated for region in regions))
+
+        # Pieces taller than a page fit only if every engine rotates them.
+        pieces = self.make_random_pieces(width=(3, 5), height=(30, 34), num_pieces=40)
+        pages = blf_solver.solve_pages(pieces=pieces, container_width=100, max_height=20, options=options)
+        self.assertEqual(sum(len(regions) for _, _, regions in pages), len(pieces))
+        self.assertTrue(all(height <= 20 for _, height, _ in pages))
+        for engine in ('skyline', tuple(sorted(blf_solver.ENGINES.keys()))):
+            with self.subTest(engine=engine):
+                with self.assertRaisesRegex(ValueError, 'taller'):
+                    blf_solver.solve_pages(
+                        pieces=pieces, container_width=100, max_height=20, options=dict(options, engine=engine))
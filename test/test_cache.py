@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import TestCase
+
+import sys
+sys.path.append('../')
+from image_packer import blf
+from image_packer import cache
+
+
+class TestCache(TestCase):
+
+    def test_make_layout_key(self):
+        pieces = [blf.Piece(uid=i, size=blf.Size(w, h)) for i, (w, h) in enumerate(((1, 2), (3, 4), (1, 2)))]
+        options = {'margin': blf.Thickness(1, 1, 1, 1), 'engine': ('blf', 'shelf')}
+        key = cache.make_layout_key(pieces, 100, options)
+        # The order and the ids of the pieces do not matter.
+        reordered = [blf.Piece(uid=uid, size=piece.size) for uid, piece in zip('abc', reversed(pieces))]
+        self.assertEqual(cache.make_layout_key(reordered, 100, options), key)
+        #
+        self.assertNotEqual(cache.make_layout_key(pieces[:2], 100, options), key)
+        self.assertNotEqual(cache.make_layout_key(pieces, 101, options), key)
+        self.assertNotEqual(cache.make_layout_key(pieces, 100, dict(options, engine='blf')), key)
+        self.assertIsNone(cache.make_layout_key(pieces, 100, dict(options, orderings=(lambda piece: 0, ))))
+
+    def test_layout_cache(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            filepath = os.path.join(workpath, 'layouts.db')
+            with cache.LayoutCache(filepath, max_entries=2) as layout_cache:
+                self.assertIsNone(layout_cache.get('a'))
+                layout_cache.put('a', 10, 20, [(0, 1, 2)])
+                layout_cache.put('b', 10, 20, [(0, 1, 2)])
+                self.assertEqual(layout_cache.get('a'), (10, 20, [(0, 1, 2)]))
+                # 'b' is the least recently used.
+                layout_cache.put('c', 30, 40, [(0, 3, 4), (1, 5, 6)])
+                self.assertEqual(len(layout_cache), 2)
+                self.assertIsNone(layout_cache.get('b'))
+            # The layouts persist.
+            with cache.LayoutCache(filepath, max_entries=2) as layout_cache:
+                self.assertEqual(layout_cache.get('c'), (30, 40, [(0, 3, 4), (1, 5, 6)]))
+                layout_cache.put('d', 1, 1, [])
+                self.assertIsNone(layout_cache.get('a'))
+                layout_cache.clear()
+                self.assertEqual(len(layout_cache), 0)
+            # Another build may use the database at the same time.
+            with cache.LayoutCache(filepath) as layout_cache, cache.LayoutCache(filepath) as other_cache:
+                layout_cache.put('e', 1, 1, [(0, 0, 0, 1)])
+                self.assertEqual(other_cache.get('e'), (1, 1, [(0, 0, 0, 1)]))
+
+    def test_metadata_cache(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            filepath = os.path.join(workpath, 'metadata.db')
+            entries = [('/image/{}.png'.format(i), i, i + 1, i + 2, i + 3, i + 4, i % 2 == 0) for i in range(1200)]
+            with cache.MetadataCache(filepath) as metadata_cache:
+                metadata_cache.put_many(entries)
+                self.assertEqual(len(metadata_cache), len(entries))
+            # The entries persist, and lookups are not limited by the number of query parameters.
+            with cache.MetadataCache(filepath) as metadata_cache:
+                found = metadata_cache.get_many([entry[0] for entry in entries] + ['/image/unknown.png'])
+                self.assertEqual(found, {entry[0]: entry[1:] for entry in entries})
+                metadata_cache.clear()
+                self.assertEqual(len(metadata_cache), 0)
@@ -62,3 +62,29 @@ class TestCliPack(TestCase):
             returncode = subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
             self.assertEqual(returncode, 1)
             self.assertFalse(os.path.exists(output_filepath))
+
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=4, dirpath=workpath)
+
+            output_filepath = workpath + '/output.png'
+
+            command = 'impack -i {i} -o {o} -w 100 --engine shelf skyline'.format(
+                i=workpath + '/*.*',
+                o=output_filepath,
+            )
+            returncode = subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            self.assertEqual(returncode, 0)
+            self.assertTrue(os.path.exists(output_filepath))
+
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=4, dirpath=workpath)
+
+            output_filepath = workpath + '/output.png'
+
+            command = 'impack -i {i} -o {o} -w auto --force-pow2'.format(
+                i=workpath + '/*.*',
+                o=output_filepath,
+            )
+            returncode = subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            self.assertEqual(returncode, 0)
+            self.assertTrue(os.path.exists(output_filepath))
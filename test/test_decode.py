@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import glob
+import os
+import tempfile
+from PIL import Image
+from unittest import TestCase
+
+import sys
+sys.path.append('../')
+from image_packer import decode
+from image_packer import tools
+
+
+class TestDecode(TestCase):
+
+    def test_iter_decoded(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            tools.make_random_jpeg_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            filepaths = sorted(glob.glob(os.path.join(workpath, '*.*')))
+            expected = list()
+            for filepath in filepaths:
+                with Image.open(filepath) as im:
+                    expected.append((im.size, im.mode, im.tobytes()))
+            sizes = [size for size, _, _ in expected]
+
+            # Any budget gives the images in order, even one smaller than an image.
+            for memory_budget in (1, 64 * 64 * 4, decode.DEFAULT_MEMORY_BUDGET):
+                with self.subTest(memory_budget=memory_budget):
+                    images = decode.iter_decoded(filepaths, sizes, max_workers=4, memory_budget=memory_budget)
+                    self.assertEqual([(im.size, im.mode, im.tobytes()) for im in images], expected)
+            #
+            self.assertEqual(list(decode.iter_decoded([], [])), [])
+            # The consumer may stop early.
+            images = decode.iter_decoded(filepaths, sizes, max_workers=4)
+            self.assertEqual(next(images).size, sizes[0])
+            images.close()
+
+    def test_decoded_image_cache(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            filepaths = list()
+            for i in range(3):
+                filepath = os.path.join(workpath, '{}.png'.format(i))
+                Image.new(mode='RGBA', size=(10, 10), color=(i, 0, 0, 255)).save(filepath)
+                filepaths.append(filepath)
+
+            # Two images of 400 bytes fit.
+            image_cache = decode.DecodedImageCache(max_bytes=800)
+            self.assertIsNone(image_cache.get(filepaths[0]))
+            im = image_cache.decode(filepaths[0])
+            self.assertIs(image_cache.decode(filepaths[0]), im)
+            image_cache.decode(filepaths[1])
+            self.assertEqual((len(image_cache), image_cache.num_bytes), (2, 800))
+            # The least recently used image is evicted.
+            image_cache.get(filepaths[0])
+            image_cache.decode(filepaths[2])
+            self.assertIsNone(image_cache.get(filepaths[1]))
+            self.assertIs(image_cache.get(filepaths[0]), im)
+            # A changed file is decoded again.
+            Image.new(mode='RGBA', size=(5, 5)).save(filepaths[0])
+            self.assertIsNone(image_cache.get(filepaths[0]))
+            self.assertEqual(image_cache.decode(filepaths[0]).size, (5, 5))
+            # Images larger than the cache are not kept.
+            large_image_cache = decode.DecodedImageCache(max_bytes=100)
+            self.assertEqual(large_image_cache.decode(filepaths[1]).size, (10, 10))
+            self.assertEqual(len(large_image_cache), 0)
+            #
+            image_cache.clear()
+            self.assertEqual((len(image_cache), image_cache.num_bytes), (0, 0))
+            images = decode.iter_decoded(filepaths, [(10, 10)] * 3, max_workers=2, cache=image_cache)
+            self.assertEqual([im.size for im in images], [(5, 5), (10, 10), (10, 10)])
+            self.assertEqual((len(image_cache), image_cache.num_bytes), (2, 800))
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+sys.path.append('../')
+from image_packer import blf
+from image_packer import blf_solver
+from helpers import LayoutTestCase
+
+
+class TestEngines(LayoutTestCase):
+
+    def test_layout(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=100)
+        for name, engine in blf_solver.ENGINES.items():
+            for margin in (blf.Thickness(0, 0, 0, 0), blf.Thickness(1, 2, 3, 4)):
+                for collapse_margin in (False, True):
+                    with self.subTest(engine=name, margin=margin, collapse_margin=collapse_margin):
+                        options = {'margin': margin, 'collapse_margin': collapse_margin}
+                        container_width, regions = engine(pieces, 200, options)
+                        self.assert_valid_layout(
+                            pieces, container_width, regions, blf.CorrectionInfo(margin, collapse_margin))
+
+    def test_options(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=10)
+        for name, engine in blf_solver.ENGINES.items():
+            with self.subTest(engine=name):
+                container_width, _ = engine(pieces, 1)
+                self.assertEqual(container_width, max(piece.size.width for piece in pieces))
+
+                container_width, _ = engine(pieces, 100, {'force_pow2': True})
+                self.assertEqual(container_width, 128)
+
+                with self.assertRaises(blf.LocationNotFoundError):
+                    engine(pieces, 1, {'enable_auto_size': False})
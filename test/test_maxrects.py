@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+sys.path.append('../')
+from image_packer import maxrects
+from helpers import LayoutTestCase
+
+
+class TestMaxRects(LayoutTestCase):
+
+    def test_heuristic(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=10)
+        with self.assertRaises(ValueError):
+            maxrects.maxrects(pieces, 100, heuristic='unknown')
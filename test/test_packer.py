@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import collections
+import glob
 import json
 import logging
 import math
@@ -13,6 +14,8 @@ import sys
 sys.path.append('../')
 from image_packer import packer
 from image_packer import blf
+from image_packer import decode
+from image_packer import raw
 from image_packer import tools
 
 
@@ -248,6 +251,335 @@ class TestPacker(TestCase):
 
                 self.assertTrue(os.path.exists(os.path.splitext(output_filepath)[0] + '.json'))
 
+    def test_engine(self):
+        for engine in ('blf', 'blf_numpy', 'skyline'):
+            with tempfile.TemporaryDirectory() as workpath:
+                tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=4, dirpath=workpath)
+                tools.make_random_bmp_files(width=(1, 64), height=(1, 64), num_files=3, dirpath=workpath)
+                tools.make_random_jpeg_files(width=(1, 64), height=(1, 64), num_files=3, dirpath=workpath)
+
+                input_filepaths = [os.path.join(workpath, '*.*'), ]
+                output_filepath = os.path.join(workpath, 'output.png')
+                container_width = 100
+
+                options = {
+                    'margin': (1, 1, 1, 1),
+                    'engine': engine
+                }
+
+                packer.pack(
+                    input_filepaths=input_filepaths,
+                    output_filepath=output_filepath,
+                    container_width=container_width,
+                    options=options
+                )
+                self.assertTrue(os.path.exists(output_filepath))
+                self.assertTrue(os.path.exists(os.path.splitext(output_filepath)[0] + '.json'))
+
+    def test_add_and_remove(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            for name in ('base', 'small', 'large'):
+                os.mkdir(os.path.join(workpath, name))
+            tools.make_random_png32_files(width=(16, 64), height=(16, 64), num_files=20, dirpath=workpath + '/base')
+            tools.make_random_png32_files(width=(1, 4), height=(1, 4), num_files=2, dirpath=workpath + '/small')
+            tools.make_random_png32_files(width=(200, 200), height=(200, 200), num_files=1, dirpath=workpath + '/large')
+
+            output_filepath = os.path.join(workpath, 'output.png')
+            config_filepath = os.path.join(workpath, 'output.json')
+            options = {'margin': (1, 1, 1, 1)}
+
+            packer.pack(
+                input_filepaths=[os.path.join(workpath, 'base', '*.png')],
+                output_filepath=output_filepath,
+                container_width=128,
+                options=options
+            )
+
+            def load_config():
+                with open(config_filepath, 'r', encoding='utf-8') as fp:
+                    config = json.load(fp)
+                return config, {value['filepath']: (value['x'], value['y']) for value in config['regions'].values()}
+
+            config, placed = load_config()
+
+            # Removing frees the space, and small images fit into the free space without moving the others.
+            mutable_packer = packer.Packer.load(filepath=config_filepath, options=options)
+            removed_filepath = sorted(placed)[0]
+            self.assertEqual(mutable_packer.remove([removed_filepath]), 1)
+            self.assertTrue(mutable_packer.add([os.path.join(workpath, 'small', '*.png')]))
+            mutable_packer.save(output_filepath)
+
+            new_config, new_placed = load_config()
+            self.assertEqual((new_config['width'], new_config['height']), (config['width'], config['height']))
+            self.assertEqual(len(new_placed), len(placed) + 1)
+            self.assertNotIn(removed_filepath, new_placed)
+            for filepath, position in placed.items():
+                if filepath != removed_filepath:
+                    self.assertEqual(new_placed[filepath], position)
+
+            # A large image does not fit, so all images are packed again.
+            mutable_packer = packer.Packer.load(filepath=config_filepath, options=options)
+            self.assertFalse(mutable_packer.add([os.path.join(workpath, 'large', '*.png')]))
+            mutable_packer.save(output_filepath)
+            new_config, new_placed = load_config()
+            self.assertEqual(len(new_placed), len(placed) + 2)
+            self.assertTrue(new_config['width'] >= 202)
+
+    def test_incremental(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            input_filepaths = sorted(glob.glob(os.path.join(workpath, '*.png')))
+            output_filepath = os.path.join(workpath, 'output', 'output.png')
+            expected_filepath = os.path.join(workpath, 'output', 'expected.png')
+            os.mkdir(os.path.dirname(output_filepath))
+            options = {'margin': (1, 1, 1, 1), 'bg_color': (0.5, 0.5, 0.5, 1.0), 'incremental': True}
+
+            packer.pack(
+                input_filepaths=input_filepaths,
+                output_filepath=output_filepath,
+                container_width=100,
+                options=options
+            )
+            with open(os.path.splitext(output_filepath)[0] + '.json', 'r', encoding='utf-8') as fp:
+                config = json.load(fp)
+            for value in config['regions'].values():
+                self.assertEqual(set(value['fingerprint'].keys()), {'mtime', 'size', 'sha1'})
+
+            # Change the content of an image, but not its size.
+            with Image.open(input_filepaths[0]) as im:
+                Image.new(mode='RGBA', size=im.size, color=(1, 2, 3, 4)).save(input_filepaths[0])
+            packer.pack(
+                input_filepaths=input_filepaths,
+                output_filepath=output_filepath,
+                container_width=100,
+                options=options
+            )
+            packer.pack(
+                input_filepaths=input_filepaths,
+                output_filepath=expected_filepath,
+                container_width=100,
+                options=dict(options, incremental=False)
+            )
+            with Image.open(output_filepath) as actual, Image.open(expected_filepath) as expected:
+                self.assertEqual(actual.tobytes(), expected.tobytes())
+
+            # The space of a removed image is cleared.
+            mutable_packer = packer.Packer.load(
+                filepath=os.path.splitext(output_filepath)[0] + '.json', options=options)
+            mutable_packer.remove([input_filepaths[1]])
+            mutable_packer.save(output_filepath)
+            expected_packer = packer.Packer.load(
+                filepath=os.path.splitext(output_filepath)[0] + '.json', options=dict(options, incremental=False))
+            expected_packer.save(expected_filepath)
+            with Image.open(output_filepath) as actual, Image.open(expected_filepath) as expected:
+                self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def test_image_cache(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=5, dirpath=workpath)
+            input_filepaths = [os.path.join(workpath, '*.png')]
+            image_cache = decode.DecodedImageCache()
+            expected_filepath = os.path.join(workpath, 'expected.out')
+            packer.pack(
+                input_filepaths=input_filepaths,
+                output_filepath=expected_filepath,
+                container_width=100
+            )
+            # The images are decoded once, and the pack at another width uses them too.
+            image_packer = packer.Packer(filepaths=input_filepaths, image_cache=image_cache)
+            image_packer.pack(filepath=os.path.join(workpath, 'output.out'), container_width=100)
+            self.assertEqual(len(image_cache), 5)
+            image_packer.pack(filepath=os.path.join(workpath, 'output.out'), container_width=80)
+            self.assertEqual(len(image_cache), 5)
+            # A new packer takes the sizes from the decoded images.
+            image_packer = packer.Packer(filepaths=input_filepaths, image_cache=image_cache)
+            image_packer.pack(filepath=os.path.join(workpath, 'output.out'), container_width=100)
+            with Image.open(os.path.join(workpath, 'output.out')) as actual, Image.open(expected_filepath) as expected:
+                self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def test_strip_height(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            tools.make_random_jpeg_files(width=(1, 64), height=(1, 64), num_files=5, dirpath=workpath)
+            input_filepaths = [os.path.join(workpath, '*.*')]
+            expected_filepath = os.path.join(workpath, 'expected.out')
+            output_filepath = os.path.join(workpath, 'output.out')
+            for enable_vertical_flip in (True, False):
+                options = {'margin': (1, 1, 1, 1), 'enable_vertical_flip': enable_vertical_flip}
+                packer.pack(
+                    input_filepaths=input_filepaths,
+                    output_filepath=expected_filepath,
+                    container_width=100,
+                    options=options
+                )
+                for strip_height in (1, 7, 1000):
+                    with self.subTest(enable_vertical_flip=enable_vertical_flip, strip_height=strip_height):
+                        packer.pack(
+                            input_filepaths=input_filepaths,
+                            output_filepath=output_filepath,
+                            container_width=100,
+                            options=dict(options, strip_height=strip_height)
+                        )
+                        with Image.open(output_filepath) as actual, Image.open(expected_filepath) as expected:
+                            self.assertEqual((actual.mode, actual.size), (expected.mode, expected.size))
+                            self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def test_encode_options(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            input_filepaths = [os.path.join(workpath, '*.*')]
+            expected_filepath = os.path.join(workpath, 'expected.out')
+            output_filepath = os.path.join(workpath, 'output.out')
+            packer.pack(input_filepaths=input_filepaths, output_filepath=expected_filepath, container_width=100)
+            for options in (
+                {'compress_level': 1},
+                {'optimize': True},
+                {'compress_strategy': 'rle'},
+                {'encode_workers': 3},
+                {'encode_workers': None, 'compress_level': 9, 'compress_strategy': 'filtered'},
+                {'encode_workers': 3, 'strip_height': 7},
+            ):
+                with self.subTest(options=options):
+                    packer.pack(
+                        input_filepaths=input_filepaths,
+                        output_filepath=output_filepath,
+                        container_width=100,
+                        options=options
+                    )
+                    with Image.open(output_filepath) as actual, Image.open(expected_filepath) as expected:
+                        self.assertEqual((actual.mode, actual.size), (expected.mode, expected.size))
+                        self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def test_raw_output(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            input_filepaths = [os.path.join(workpath, '*.png')]
+            expected_filepath = os.path.join(workpath, 'expected.out')
+            output_filepath = os.path.join(workpath, 'output.raw')
+            for enable_vertical_flip in (True, False):
+                options = {'enable_vertical_flip': enable_vertical_flip, 'output_format': 'raw'}
+                packer.pack(
+                    input_filepaths=input_filepaths,
+                    output_filepath=expected_filepath,
+                    container_width=100,
+                    options=dict(options, output_format='png')
+                )
+                with Image.open(expected_filepath) as expected:
+                    expected.load()
+                for extra_options in ({}, {'strip_height': 7}, {'incremental': True}, {'incremental': True}):
+                    with self.subTest(enable_vertical_flip=enable_vertical_flip, extra_options=extra_options):
+                        packer.pack(
+                            input_filepaths=input_filepaths,
+                            output_filepath=output_filepath,
+                            container_width=100,
+                            options=dict(options, **extra_options)
+                        )
+                        with raw.RawImage(output_filepath) as actual:
+                            self.assertEqual((actual.mode, actual.size), (expected.mode, expected.size))
+                            self.assertEqual(actual.to_image().tobytes(), expected.tobytes())
+
+    def test_max_height(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            os.mkdir(os.path.join(workpath, 'small'))
+            tools.make_random_png32_files(width=(16, 48), height=(16, 48), num_files=30, dirpath=workpath)
+            tools.make_random_png32_files(width=(1, 4), height=(1, 4), num_files=2, dirpath=workpath + '/small')
+            output_filepath = os.path.join(workpath, 'output.png')
+            config_filepath = os.path.join(workpath, 'output.json')
+            options = {'margin': (1, 1, 1, 1), 'max_height': 64, 'incremental': True}
+
+            def assert_pages():
+                with open(config_filepath, 'r', encoding='utf-8') as fp:
+                    config = json.load(fp)
+                self.assertTrue(len(config['pages']) > 1)
+                self.assertFalse(os.path.exists(output_filepath))
+                pages = list()
+                for i, page in enumerate(config['pages']):
+                    expected_filepath = os.path.join(workpath, 'output_{}.png'.format(i))
+                    self.assertEqual(os.path.abspath(page['filepath']), expected_filepath)
+                    self.assertTrue(page['height'] <= 64)
+                    im = Image.open(page['filepath'])
+                    im.load()
+                    self.assertEqual(im.size, (page['width'], page['height']))
+                    pages.append(im)
+                for value in config['regions'].values():
+                    box = (value['x'], value['y'], value['x'] + value['width'], value['y'] + value['height'])
+                    with Image.open(value['filepath']) as expected:
+                        self.assertEqual(pages[value['page']].crop(box).tobytes(), expected.tobytes())
+                return config
+
+            def placements(config):
+                return [
+                    (value['filepath'], value['page'], value['x'], value['y']) for value in config['regions'].values()
+                ]
+
+            packer.pack(
+                input_filepaths=[os.path.join(workpath, '*.png')],
+                output_filepath=output_filepath,
+                container_width=128,
+                options=options
+            )
+            config = assert_pages()
+            self.assertEqual(len(config['regions']), 30)
+
+            # The pages are loaded, and the images are added to the free space of a page.
+            mutable_packer = packer.Packer.load(filepath=config_filepath, options=options)
+            self.assertTrue(mutable_packer.add([os.path.join(workpath, 'small', '*.png')]))
+            mutable_packer.save(output_filepath)
+            new_config = assert_pages()
+            self.assertEqual(len(new_config['regions']), 32)
+            placed = {
+                value['filepath']: (value['page'], value['x'], value['y']) for value in config['regions'].values()
+            }
+            for value in new_config['regions'].values():
+                if value['filepath'] in placed:
+                    self.assertEqual((value['page'], value['x'], value['y']), placed[value['filepath']])
+
+            # The pages are kept without the option.
+            packer.Packer.load(filepath=config_filepath).save(output_filepath)
+            self.assertEqual(placements(assert_pages()), placements(new_config))
+
+            with self.assertRaises(ValueError):
+                packer.pack(
+                    input_filepaths=[os.path.join(workpath, '*.png')],
+                    output_filepath=output_filepath,
+                    container_width=128,
+                    options={'max_height': 32}
+                )
+
+    def test_enable_rotation(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            os.mkdir(os.path.join(workpath, 'input'))
+            tools.make_random_png32_files(width=(1, 8), height=(16, 64), num_files=20, dirpath=workpath + '/input')
+            # This image fits only rotated.
+            tools.make_random_png32_files(width=(100, 100), height=(2, 2), num_files=1, dirpath=workpath + '/input')
+            output_filepath = os.path.join(workpath, 'output.png')
+            config_filepath = os.path.join(workpath, 'output.json')
+            options = {'margin': (1, 1, 1, 1), 'enable_rotation': True}
+            for strip_height in (None, 7):
+                with self.subTest(strip_height=strip_height):
+                    packer.pack(
+                        input_filepaths=[os.path.join(workpath, 'input', '*.png')],
+                        output_filepath=output_filepath,
+                        container_width=64,
+                        options=dict(options, strip_height=strip_height)
+                    )
+                    with open(config_filepath, 'r', encoding='utf-8') as fp:
+                        config = json.load(fp)
+                    self.assertTrue(any(value['rotated'] for value in config['regions'].values()))
+                    with Image.open(output_filepath) as actual:
+                        for value in config['regions'].values():
+                            box = (value['x'], value['y'], value['x'] + value['width'], value['y'] + value['height'])
+                            with Image.open(value['filepath']) as expected:
+                                if value['rotated']:
+                                    expected = expected.transpose(Image.ROTATE_270)
+                                self.assertEqual(actual.crop(box).tobytes(), expected.tobytes())
+
+            # The rotated regions are loaded as they are.
+            mutable_packer = packer.Packer.load(filepath=config_filepath, options=options)
+            mutable_packer.save(output_filepath)
+            with open(config_filepath, 'r', encoding='utf-8') as fp:
+                self.assertEqual(json.load(fp)['regions'], config['regions'])
+
     def test_configuration(self):
         with tempfile.TemporaryDirectory(dir='.') as workpath:
             tools.make_random_png24_files(width=(1, 64), height=(1, 64), num_files=4, dirpath=workpath)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import random
+import zlib
+from PIL import Image
+from unittest import TestCase
+
+import sys
+sys.path.append('../')
+from image_packer import png
+
+
+class TestPng(TestCase):
+
+    @staticmethod
+    def make_random_image(mode, width, height):
+        data = bytes(random.randint(0, 255) for _ in range(width * height * len(mode)))
+        return Image.frombytes(mode=mode, size=(width, height), data=data)
+
+    def test_writer(self):
+        for mode in ('RGB', 'RGBA'):
+            for width, height, rows_per_write in ((1, 1, 1), (37, 50, 7), (300, 300, 300)):
+                with self.subTest(mode=mode, width=width, height=height):
+                    image = self.make_random_image(mode, width, height)
+                    fp = io.BytesIO()
+                    with png.PNGWriter(fp=fp, width=width, height=height, mode=mode) as writer:
+                        for upper in range(0, height, rows_per_write):
+                            lower = min(upper + rows_per_write, height)
+                            writer.write_rows(image.crop((0, upper, width, lower)).tobytes())
+                    fp.seek(0)
+                    with Image.open(fp) as actual:
+                        self.assertEqual((actual.mode, actual.size), (mode, (width, height)))
+                        self.assertEqual(actual.tobytes(), image.tobytes())
+
+    def test_adler32_combine(self):
+        for len1, len2 in ((0, 0), (0, 10), (10, 0), (1, 70000), (100000, 3)):
+            with self.subTest(len1=len1, len2=len2):
+                data1 = bytes(random.randint(0, 255) for _ in range(len1))
+                data2 = bytes(random.randint(0, 255) for _ in range(len2))
+                actual = png.adler32_combine(zlib.adler32(data1), zlib.adler32(data2), len2)
+                self.assertEqual(actual, zlib.adler32(data1 + data2))
+
+    def test_parallel_writer(self):
+        image = self.make_random_image('RGBA', 600, 300)
+        # Flat rows compress across the blocks.
+        image.paste((0, 0, 0, 255), (0, 0, 600, 150))
+        for strategy in sorted(png.STRATEGIES.keys()):
+            for compress_level in (0, 1, 6, 9):
+                with self.subTest(strategy=strategy, compress_level=compress_level):
+                    fp = io.BytesIO()
+                    png.save(im=image, fp=fp, compress_level=compress_level, strategy=strategy, max_workers=3)
+                    fp.seek(0)
+                    with Image.open(fp) as actual:
+                        self.assertEqual(actual.size, image.size)
+                        self.assertEqual(actual.tobytes(), image.tobytes())
+
+    def test_writer_errors(self):
+        with self.assertRaises(ValueError):
+            png.PNGWriter(fp=io.BytesIO(), width=1, height=1, mode='L')
+        with self.assertRaises(ValueError):
+            png.PNGWriter(fp=io.BytesIO(), width=1, height=1, mode='RGB', strategy='unknown')
+        writer = png.PNGWriter(fp=io.BytesIO(), width=2, height=2, mode='RGB')
+        with self.assertRaises(ValueError):
+            writer.write_rows(b'\x00' * 5)
+        writer.write_rows(b'\x00' * 6)
+        with self.assertRaises(ValueError):
+            writer.close()
+        with self.assertRaises(ValueError):
+            writer.write_rows(b'\x00' * 12)
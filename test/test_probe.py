@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import glob
+import logging
+import os
+import tempfile
+from PIL import Image
+from unittest import TestCase
+
+import sys
+sys.path.append('../')
+from image_packer import cache
+from image_packer import probe
+from image_packer import tools
+
+
+class TestProbe(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.CRITICAL)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    @staticmethod
+    def open_info(filepath):
+        with Image.open(filepath) as im:
+            return probe.ImageInfo(im.width, im.height, probe.has_alpha(im))
+
+    def test_probe(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png24_files(width=(1, 64), height=(1, 64), num_files=3, dirpath=workpath)
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=3, dirpath=workpath)
+            tools.make_random_bmp_files(width=(1, 64), height=(1, 64), num_files=3, dirpath=workpath)
+            tools.make_random_jpeg_files(width=(1, 64), height=(1, 64), num_files=3, dirpath=workpath)
+            # Palettes with and without a transparent color, gray with alpha, a progressive JPEG and a GIF.
+            palette = Image.new(mode='RGB', size=(5, 7), color=(1, 2, 3)).convert('P')
+            palette.save(os.path.join(workpath, 'palette.png'))
+            palette.save(os.path.join(workpath, 'transparent.png'), transparency=0)
+            Image.new(mode='LA', size=(6, 3)).save(os.path.join(workpath, 'gray_alpha.png'))
+            Image.new(mode='RGB', size=(9, 4)).save(os.path.join(workpath, 'progressive.jpg'), progressive=True)
+            Image.new(mode='RGB', size=(8, 2)).save(os.path.join(workpath, 'image.gif'))
+
+            filepaths = sorted(glob.glob(os.path.join(workpath, '*.*')))
+            for filepath in filepaths:
+                with self.subTest(filepath=os.path.basename(filepath)):
+                    self.assertEqual(probe.probe(filepath), self.open_info(filepath))
+            #
+            self.assertTrue(probe.probe(os.path.join(workpath, 'transparent.png')).has_alpha)
+            self.assertFalse(probe.probe(os.path.join(workpath, 'palette.png')).has_alpha)
+
+    def test_probe_all(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            tools.make_random_jpeg_files(width=(1, 64), height=(1, 64), num_files=10, dirpath=workpath)
+            filepaths = sorted(glob.glob(os.path.join(workpath, '*.*')))
+            expected = [self.open_info(filepath) for filepath in filepaths]
+            self.assertEqual(probe.probe_all(filepaths, max_workers=4), expected)
+            self.assertEqual(probe.probe_all([]), [])
+
+    def test_probe_all_with_cache(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            tools.make_random_png32_files(width=(1, 64), height=(1, 64), num_files=5, dirpath=workpath)
+            filepaths = sorted(glob.glob(os.path.join(workpath, '*.*')))
+            expected = [self.open_info(filepath) for filepath in filepaths]
+            with cache.MetadataCache(os.path.join(workpath, 'metadata.db')) as metadata_cache:
+                self.assertEqual(probe.probe_all(filepaths, cache=metadata_cache), expected)
+                self.assertEqual(len(metadata_cache), len(filepaths))
+                # Unchanged files are taken from the cache.
+                path = os.path.abspath(filepaths[0])
+                entry = metadata_cache.get_many([path])[path]
+                metadata_cache.put_many([(path, ) + entry[0:3] + (1000, 1000, False)])
+                self.assertEqual(probe.probe_all(filepaths, cache=metadata_cache)[0], (1000, 1000, False))
+                # Changed files are probed again.
+                Image.new(mode='RGB', size=(3, 2)).save(filepaths[0], format='PNG')
+                self.assertEqual(probe.probe_all(filepaths, cache=metadata_cache)[0], (3, 2, False))
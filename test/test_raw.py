@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import random
+import tempfile
+from PIL import Image
+from unittest import TestCase, skipIf
+
+import sys
+sys.path.append('../')
+from image_packer import raw
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestRaw(TestCase):
+
+    @staticmethod
+    def make_random_image(mode, width, height):
+        data = bytes(random.randint(0, 255) for _ in range(width * height * len(mode)))
+        return Image.frombytes(mode=mode, size=(width, height), data=data)
+
+    def test_write_and_read(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            filepath = os.path.join(workpath, 'image.raw')
+            for mode, width, height, row_pitch in (('RGBA', 5, 3, 20), ('RGB', 5, 3, 16), ('RGB', 4, 7, 12)):
+                with self.subTest(mode=mode, width=width, height=height):
+                    image = self.make_random_image(mode, width, height)
+                    with open(filepath, 'wb') as fp:
+                        with raw.RawWriter(fp=fp, width=width, height=height, mode=mode) as writer:
+                            writer.write_rows(image.crop((0, 0, width, 1)).tobytes())
+                            writer.write_rows(image.crop((0, 1, width, height)).tobytes())
+                    self.assertEqual(os.path.getsize(filepath), raw.HEADER_SIZE + row_pitch * height)
+
+                    with raw.RawImage(filepath) as raw_image:
+                        self.assertEqual((raw_image.mode, raw_image.size), (mode, (width, height)))
+                        self.assertEqual(raw_image.row_pitch, row_pitch)
+                        self.assertTrue(raw_image.data.readonly)
+                        self.assertEqual(len(raw_image.data), row_pitch * height)
+                        row_bytes = width * len(mode)
+                        for y in range(height):
+                            self.assertEqual(
+                                raw_image.data[y * row_pitch:y * row_pitch + row_bytes].tobytes(),
+                                image.crop((0, y, width, y + 1)).tobytes()
+                            )
+                        self.assertEqual(raw_image.to_image().tobytes(), image.tobytes())
+
+    @skipIf(numpy is None, 'numpy is not installed.')
+    def test_to_numpy(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            filepath = os.path.join(workpath, 'image.raw')
+            image = self.make_random_image('RGB', 5, 3)
+            with open(filepath, 'wb') as fp:
+                with raw.RawWriter(fp=fp, width=5, height=3, mode='RGB') as writer:
+                    writer.write_rows(image.tobytes())
+
+            with raw.RawImage(filepath) as raw_image:
+                array = raw_image.to_numpy()
+                self.assertEqual(array.shape, (3, 5, 3))
+                self.assertFalse(array.flags.writeable)
+                self.assertEqual(array.tobytes(), image.tobytes())
+                del array
+
+    def test_errors(self):
+        with tempfile.TemporaryDirectory() as workpath:
+            filepath = os.path.join(workpath, 'image.raw')
+            with open(filepath, 'wb') as fp:
+                with self.assertRaises(ValueError):
+                    raw.RawWriter(fp=fp, width=1, height=1, mode='L')
+                writer = raw.RawWriter(fp=fp, width=2, height=2, mode='RGB')
+                with self.assertRaises(ValueError):
+                    writer.write_rows(b'\x00' * 5)
+                writer.write_rows(b'\x00' * 6)
+                with self.assertRaises(ValueError):
+                    writer.close()
+            # Truncated.
+            with self.assertRaises(ValueError):
+                raw.RawImage(filepath)
+
+            Image.new('RGB', (2, 2)).save(filepath, format='PNG')
+            with self.assertRaises(ValueError):
+                raw.RawImage(filepath)
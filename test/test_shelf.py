@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+sys.path.append('../')
+from image_packer import shelf
+from helpers import LayoutTestCase
+
+
+class TestShelf(LayoutTestCase):
+
+    def test_next_fit(self):
+        pieces = self.make_random_pieces(width=(1, 64), height=(1, 64), num_pieces=100)
+        pieces.sort(key=lambda piece: -piece.size.height)
+        _, regions = shelf.shelf(pieces, 200)
+        # Each piece is placed right of the previous one, or opens a new shelf on top of the current one.
+        shelf_bottom, shelf_top = 0, 0
+        for previous, region in zip([None] + regions, regions):
+            if previous is not None and region.bottom == shelf_bottom:
+                self.assertEqual(region.left, previous.right)
+            else:
+                self.assertEqual((region.left, region.bottom), (0, shelf_top))
+                shelf_bottom = region.bottom
+            shelf_top = max(shelf_top, region.top)